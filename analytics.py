@@ -0,0 +1,178 @@
+"""Multi-week spending trends computed from the weekly rollup.
+
+A user's weekly_category_totals rows for the range are summed per week and
+category in SQL, fetched as three columns (week number, category, total)
+and pivoted with NumPy into a dense weeks x categories matrix, one row per
+Monday-started week including weeks with no spending. Week numbers count
+whole weeks since EPOCH_MONDAY. Everything else is vectorized over that
+matrix:
+
+    rolling average   mean weekly total over the last ``window`` weeks
+    growth            week-over-week change of the total, and per category
+                      the change of its last ``window`` weeks over the
+                      ``window`` weeks before
+    share             each category's part of the range's spending
+    volatility        standard deviation of the weekly totals and its
+                      coefficient of variation (std / mean)
+
+Ratios that would divide by zero, and rolling averages over fewer than
+``window`` weeks, are reported as None. NumPy is optional and only needed
+for analytics.
+"""
+import calendar
+import re
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_RANGE = '12w'
+DEFAULT_WINDOW = 4
+MAX_WEEKS = 1044  # 20 years
+_RANGE = re.compile(r'^(\d+)([wmy])$')
+EPOCH_MONDAY = date(1, 1, 1)
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """NumPy is not installed"""
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def epoch_week(day):
+    """Whole weeks from EPOCH_MONDAY to day"""
+    return (day - EPOCH_MONDAY).days // 7
+
+
+def range_bounds(text, end=None):
+    """Return (start, end) for a range such as 12w, 6m or 5y ending at end; 'all' gives start None.
+
+    start is the Monday of the first week in range, and end defaults to today in UTC, the
+    date main.py numbers weeks by; raises ValueError.
+    """
+    end = end or datetime.utcnow().date()
+    text = (text or DEFAULT_RANGE).strip().lower()
+    if text == 'all':
+        return None, end
+    match = _RANGE.match(text)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid range {text!r}; use a count of weeks, months or years such as 12w, 6m or 5y, or all")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == 'w':
+        # 1w is the current week, 2w adds the one before it, ...
+        start = week_start(end) - timedelta(weeks=count - 1)
+    else:
+        months = count * 12 if unit == 'y' else count
+        year, month = divmod(end.year * 12 + end.month - 1 - months, 12)
+        if year < 1:
+            raise ValueError(f"Range {text!r} is too long")
+        start = week_start(date(year, month + 1, min(end.day, calendar.monthrange(year, month + 1)[1])))
+    if (end - start).days // 7 + 1 > MAX_WEEKS:
+        raise ValueError(f"Range {text!r} is longer than {MAX_WEEKS} weeks")
+    return start, end
+
+
+def _rolling_mean(values, window):
+    """Trailing mean over window rows along axis 0; NaN until window rows are available"""
+    sums = np.cumsum(values, axis=0)
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sums[window - 1:]
+        out[window:] -= sums[:-window]
+        out[window - 1:] /= window
+    return out
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator with NaN where the denominator is zero"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / np.where(denominator != 0, denominator, 1), np.nan)
+
+
+def _values(array, digits):
+    """Round and convert to Python floats, NaN becoming None"""
+    return [None if value != value else value for value in np.round(array, digits).tolist()]
+
+
+def compute(weeks, categories, totals, start, end, window=DEFAULT_WINDOW):
+    """Trend report for per-week category totals between start and end (inclusive).
+
+    ``weeks`` (epoch week numbers), ``categories`` and ``totals`` are
+    equal-length sequences with one entry per week and category. ``start``
+    None means from the earliest week.
+    """
+    if np is None:
+        raise AnalyticsUnavailable("Analytics needs numpy installed")
+    weeks = np.asarray(weeks, dtype=np.int64)
+    # A dict of category codes is far cheaper than np.unique over Python strings
+    index = {}
+    codes = np.fromiter((index.setdefault(name, len(index)) for name in categories), np.int64, len(categories))
+    totals = np.asarray(totals, dtype=np.float64)
+    last = epoch_week(end)
+    first = epoch_week(start) if start is not None else int(weeks.min()) if len(weeks) else last
+    first = max(first, last - MAX_WEEKS + 1)
+    n_weeks = last - first + 1
+
+    week_index = weeks - first
+    keep = (week_index >= 0) & (week_index < n_weeks)
+    if not keep.all():
+        week_index, codes, totals = week_index[keep], codes[keep], totals[keep]
+    names = np.array(list(index), dtype=object)
+    matrix = np.bincount(
+        week_index * len(names) + codes, weights=totals, minlength=n_weeks * len(names)
+    ).reshape(n_weeks, len(names)).astype(np.float64, copy=False)
+    present = np.bincount(codes, minlength=len(names)) > 0
+    if not present.all():
+        names, matrix = names[present], matrix[:, present]
+
+    weekly = matrix.sum(axis=1)
+    grand_total = weekly.sum()
+    mean = weekly.mean()
+    std = weekly.std()
+    growth = np.full(n_weeks, np.nan)
+    growth[1:] = _ratio(weekly[1:] - weekly[:-1], weekly[:-1])
+
+    category_totals = matrix.sum(axis=0)
+    category_std = matrix.std(axis=0)
+    if n_weeks >= 2 * window:
+        recent = matrix[-window:].sum(axis=0)
+        before = matrix[-2 * window:-window].sum(axis=0)
+        category_growth = _ratio(recent - before, before)
+    else:
+        category_growth = np.full(len(names), np.nan)
+    # Largest first, ties by name
+    order = np.lexsort((names.astype(str), -category_totals)) if len(names) else np.arange(0)
+
+    week_starts = [(EPOCH_MONDAY + timedelta(weeks=week)).isoformat() for week in range(first, first + n_weeks)]
+    return {
+        "start": week_starts[0],
+        "end": end.isoformat(),
+        "weeks": n_weeks,
+        "window": window,
+        "total": round(float(grand_total), 2),
+        "weekly_mean": round(float(mean), 2),
+        "volatility": {"std": round(float(std), 2), "cv": round(float(std / mean), 4) if mean else None},
+        "series": [
+            {"week_start": week, "total": total, "rolling_average": average, "growth": change}
+            for week, total, average, change in zip(
+                week_starts, _values(weekly, 2), _values(_rolling_mean(weekly, window), 2), _values(growth, 4)
+            )
+        ],
+        "categories": [
+            {"category": name, "total": total, "share": share, "weekly_mean": weekly_mean,
+             "volatility": volatility, "growth": change}
+            for name, total, share, weekly_mean, volatility, change in zip(
+                names[order].tolist(),
+                _values(category_totals[order], 2),
+                _values(_ratio(category_totals[order], grand_total), 4),
+                _values(category_totals[order] / n_weeks, 2),
+                _values(category_std[order], 2),
+                _values(category_growth[order], 4),
+            )
+        ],
+    }
+
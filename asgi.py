@@ -0,0 +1,698 @@
+"""ASGI entry point serving the expense API on asyncio.
+
+The Flask app in main.py ties up one worker thread per in-flight request,
+most of which is spent waiting on round trips to the remote database. This
+module exposes the same /api routes as a Quart app backed by SQLAlchemy's
+asyncio extension (asyncpg for PostgreSQL, aiosqlite for SQLite), so a
+single process can keep hundreds of requests in flight.
+
+Models, queries, the identity cache, password hashing and the rollup and
+version bookkeeping are all shared with main.py. Run it with any ASGI server:
+
+    pip install -r requirements-async.txt
+    hypercorn asgi:app --bind 0.0.0.0:5004
+
+The async database URL is derived from DATABASE_URL unless
+ASYNC_DATABASE_URL is set.
+
+Not served here: bulk import, the background job endpoints, the HTML pages
+(with /api/internal/static_assets) and read-replica routing (with
+/api/internal/replicas). Every other /api/internal route and /metrics are
+mirrored.
+"""
+import asyncio
+import os
+from datetime import datetime
+from functools import wraps
+
+from quart import Quart, Response, g, jsonify, request
+from quart.wrappers.response import DataBody, IterableBody
+from quart_cors import cors
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+import analytics
+import exporter
+import instrumentation
+import main
+import pooling
+import serialization
+from main import (
+    DASHBOARD_TREND_MAX, DASHBOARD_TREND_WEEKS, EXPENSE_FIELDS, EXPENSE_PAGE_MAX, STREAM_BATCH_SIZE,
+    WEEK_ITEM_COLUMNS, WEEK_ITEM_FIELDS, CategoryForecast, Expense, User, analytics_query, analytics_report,
+    apply_expense_batch, category_totals_query, decode_cursor, dashboard_payload, dashboard_weeks, encode_cursor,
+    export_query, expense_history_query, expense_rows, forecasts_payload, parse_analytics_args, parse_batch,
+    parse_export_args, parse_page_limit, password_hasher, period_bounds, response_compression,
+    summarize_category_totals, sync_week_expenses, to_amount, unknown_users_error, user_cache, version_query,
+    week_bounds, week_expenses_query, week_range, weeks_payload, VersionStamp
+)
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(url):
+    """Swap the sync driver in a SQLAlchemy URL for its asyncio counterpart"""
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    if url.get_backend_name() == 'postgresql' and 'sslmode' in url.query:
+        # asyncpg spells libpq's sslmode as ssl
+        url = url.update_query_dict({'ssl': url.query['sslmode']}).difference_update_query(['sslmode'])
+    return url
+
+
+class TrackedSession(Session):
+    """Sync session behind each AsyncSession, carrying main.py's rollup/version hooks"""
+
+
+event.listen(TrackedSession, 'before_flush', main.track_expense_changes)
+event.listen(TrackedSession, 'before_commit', main.apply_tracked_changes)
+event.listen(TrackedSession, 'after_soft_rollback', main.discard_tracked_changes)
+
+ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL') or async_database_url(main.app.config['SQLALCHEMY_DATABASE_URI'])
+engine = create_async_engine(
+    ASYNC_DATABASE_URL, **pooling.engine_options(ASYNC_DATABASE_URL, poolclass=pooling.InstrumentedAsyncQueuePool)
+)
+SessionFactory = async_sessionmaker(engine, sync_session_class=TrackedSession, expire_on_commit=False)
+
+app = cors(Quart(__name__))
+
+
+@app.after_serving
+async def dispose_engine():
+    # aiosqlite connections run on non-daemon threads; close them so the server can exit
+    await engine.dispose()
+
+
+@app.before_request
+async def open_session():
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    g.request_stats = instrumentation.begin(request.method, route)
+    g.session = SessionFactory()
+
+
+@app.after_request
+async def record_request_timing(response):
+    token = g.pop('request_stats', None)
+    if token is not None:
+        stats = instrumentation.finish(token, response.status_code)
+        response.headers['Server-Timing'] = instrumentation.server_timing(stats)
+    return response
+
+
+async def compressed_chunks(encoding, body):
+    stream = response_compression.stream(encoding, streamed=True)
+    try:
+        async with body as chunks:
+            async for chunk in chunks:
+                if chunk:
+                    out = stream.compress(chunk)
+                    if out:
+                        yield out
+        yield stream.finish()
+    finally:
+        response_compression.record(stream, streamed=True)
+
+
+@app.after_request
+async def compress_api_response(response):
+    if (not request.path.startswith('/api/') or not isinstance(response.response, (DataBody, IterableBody))
+            or not 200 <= response.status_code < 300 or response.status_code == 204
+            or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers):
+        return response
+    encoding = response_compression.negotiate(request.accept_encodings, response.mimetype)
+    if encoding is None:
+        return response
+    if isinstance(response.response, IterableBody):
+        response.response = IterableBody(compressed_chunks(encoding, response.response))
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response_compression.compress(encoding, await response.get_data())
+        if body is None:
+            return response
+        response.set_data(body)
+    response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.teardown_request
+async def close_session(exc):
+    session = g.pop('session', None)
+    if session is not None:
+        await session.close()
+
+
+async def user_exists(username):
+    exists = user_cache.get(username)
+    if exists is None:
+        result = await g.session.execute(select(User.id).where(User.username == username))
+        exists = result.first() is not None
+        user_cache.set(username, exists)
+    return exists
+
+
+async def version_stamp(username, start=None, end=None):
+    version, updated_at = (await g.session.execute(version_query(username, start, end))).one()
+    return VersionStamp(request, f"{username}|{start}|{end}", version or 0, updated_at)
+
+
+async def summarize(username, start, end):
+    return summarize_category_totals(await g.session.execute(category_totals_query(username, start, end)))
+
+
+def encoded_response(payload):
+    body, mimetype = serialization.encode(payload, request.accept_mimetypes)
+    return Response(body, mimetype=mimetype)
+
+
+# --- API Routes ---
+
+@app.route('/api/signup', methods=['POST'])
+async def signup():
+    data = await request.get_json()
+    if not data or not data.get("username") or not data.get("password"):
+        return jsonify({"error": "Username and password are required"}), 400
+
+    if await user_exists(data['username']):
+        return jsonify({"error": "Username already exists"}), 409
+
+    hashed_password = await asyncio.to_thread(password_hasher.hash, data["password"])
+    user = User(username=data["username"], password=hashed_password)
+
+    try:
+        g.session.add(user)
+        await g.session.commit()
+        user_cache.set(user.username, True)
+        return jsonify({"message": "User created successfully"}), 201
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+
+@app.route('/api/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    if not data or not data.get('username') or not data.get('password'):
+        return jsonify({"error": "Username and password are required"}), 400
+
+    result = await g.session.execute(select(User).where(User.username == data['username']))
+    user = result.scalars().first()
+    user_cache.set(data['username'], user is not None)
+    if not user or not await asyncio.to_thread(password_hasher.verify, user.password, data['password']):
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    if password_hasher.needs_rehash(user.password):
+        try:
+            user.password = await asyncio.to_thread(password_hasher.hash, data['password'])
+            await g.session.commit()
+        except Exception:
+            await g.session.rollback()
+
+    return jsonify({"message": "Login successful", "user": user.to_dict()}), 200
+
+
+@app.route('/api/add_expense', methods=['POST'])
+async def add_expense():
+    data = await request.get_json()
+    required_fields = ['username', 'category', 'amount', 'week_date']
+    if not all(field in data for field in required_fields):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    if not await user_exists(data['username']):
+        return jsonify({"error": "User not found"}), 404
+
+    try:
+        expense = Expense(
+            username=data['username'],
+            category=data['category'],
+            amount=to_amount(data['amount']),
+            week_date=datetime.strptime(data['week_date'], '%Y-%m-%d').date()
+        )
+        g.session.add(expense)
+        await g.session.commit()
+        return jsonify({"message": "Expense added successfully", "expense": expense.to_dict()}), 201
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Failed to add expense: {str(e)}"}), 500
+
+
+@app.route('/api/get_expenses/<string:username>', methods=['GET'])
+async def get_expenses(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    try:
+        after = decode_cursor(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    try:
+        limit = parse_page_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stamp = await version_stamp(username)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    query = expense_history_query(username, after)
+
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        if limit:
+            query = query.limit(limit)
+
+        async def generate():
+            # The request session is closed at teardown, so the stream owns its own
+            async with SessionFactory() as session:
+                rows = await session.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+                async for row in rows:
+                    yield serialization.dumps_json(dict(zip(EXPENSE_FIELDS, row))) + b"\n"
+
+        return stamp.apply(Response(generate(), mimetype='application/x-ndjson'))
+
+    if limit is None and after is None:
+        expenses = (await g.session.execute(query)).all()
+        return stamp.apply(encoded_response({
+            "username": username,
+            "expenses": expense_rows(expenses),
+            "total_expenses": len(expenses)
+        })), 200
+
+    limit = limit or EXPENSE_PAGE_MAX
+    expenses = (await g.session.execute(query.limit(limit + 1))).all()
+    has_more = len(expenses) > limit
+    expenses = expenses[:limit]
+    return stamp.apply(encoded_response({
+        "username": username,
+        "expenses": expense_rows(expenses),
+        "total_expenses": len(expenses),
+        "next_cursor": encode_cursor(expenses[-1]) if has_more else None
+    })), 200
+
+
+@app.route('/api/weekly_summary/<string:username>', methods=['GET'])
+async def weekly_summary(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    start_of_week, end_of_week = period_bounds('week')
+    summary = await summarize(username, start_of_week, end_of_week)
+
+    if not summary["expense_count"]:
+        return jsonify({
+            "username": username,
+            "period": f"{start_of_week} to {end_of_week}",
+            "message": "No expenses found for the current week."
+        }), 200
+
+    return jsonify({
+        "username": username,
+        "period": f"{start_of_week} to {end_of_week}",
+        **summary
+    }), 200
+
+
+@app.route('/api/summary/<string:username>', methods=['GET'])
+async def get_summary(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    period = request.args.get('period', 'week')
+    try:
+        if 'start' in request.args or 'end' in request.args:
+            period = 'custom'
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+        else:
+            anchor = request.args.get('date')
+            anchor = datetime.strptime(anchor, '%Y-%m-%d').date() if anchor else None
+            start, end = period_bounds(period, anchor)
+    except KeyError:
+        return jsonify({"error": "Both start and end are required for a custom range"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {str(e)}"}), 400
+
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
+
+    return jsonify({
+        "username": username,
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        **await summarize(username, start, end)
+    }), 200
+
+
+@app.route('/api/analytics/<string:username>', methods=['GET'])
+async def get_analytics(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        start, end, window = parse_analytics_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stamp = await version_stamp(username, start, end)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    rows = (await g.session.execute(analytics_query(username, start, end))).all()
+    try:
+        report = analytics_report(rows, start, end, window)
+    except analytics.AnalyticsUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+    return stamp.apply(encoded_response({"username": username, **report}))
+
+
+@app.route('/api/forecasts/<string:username>', methods=['GET'])
+async def get_forecasts(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    query = select(CategoryForecast).where(CategoryForecast.username == username)
+    if request.args.get('anomalies') in ('1', 'true'):
+        query = query.where(CategoryForecast.anomaly.is_(True))
+    forecasts = (await g.session.execute(query.order_by(CategoryForecast.category))).scalars().all()
+    return jsonify(forecasts_payload(username, forecasts)), 200
+
+
+@app.route('/api/expenses/<int:expense_id>', methods=['PUT'])
+async def update_expense(expense_id):
+    expense = await g.session.get(Expense, expense_id)
+    if not expense:
+        return jsonify({"error": "Expense not found"}), 404
+    data = await request.get_json()
+
+    try:
+        if 'category' in data:
+            expense.category = data['category']
+        if 'amount' in data:
+            expense.amount = to_amount(data['amount'])
+        if 'week_date' in data:
+            expense.week_date = datetime.strptime(data['week_date'], '%Y-%m-%d').date()
+        await g.session.commit()
+        return jsonify({"message": "Expense updated successfully", "expense": expense.to_dict()}), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Failed to update expense: {str(e)}"}), 500
+
+
+@app.route('/api/expenses/<int:expense_id>', methods=['DELETE'])
+async def delete_expense(expense_id):
+    expense = await g.session.get(Expense, expense_id)
+    if not expense:
+        return jsonify({"error": "Expense not found"}), 404
+    try:
+        await g.session.delete(expense)
+        await g.session.commit()
+        return jsonify({"message": "Expense deleted successfully"}), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Failed to delete expense: {str(e)}"}), 500
+
+
+@app.route('/api/batch', methods=['POST'])
+async def batch_expenses():
+    operations, error = parse_batch(await request.get_json(silent=True))
+    if error:
+        return jsonify(error[0]), error[1]
+    unknown = {op["username"] for op in operations if op["op"] == 'add' and not await user_exists(op["username"])}
+    if unknown:
+        return jsonify(unknown_users_error(operations, unknown)), 404
+
+    try:
+        results, ok = await g.session.run_sync(apply_expense_batch, operations)
+        if not ok:
+            await g.session.rollback()
+            return jsonify({"error": "Expense not found", "results": results}), 404
+        await g.session.commit()
+        return jsonify({"message": f"Applied {len(results)} operations", "results": results}), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Failed to apply batch: {str(e)}"}), 500
+
+
+@app.route('/api/export/<string:username>', methods=['GET'])
+async def export_expenses(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        fmt, start, end, categories = parse_export_args(request.args)
+        encoder = exporter.encoder(fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stamp = await version_stamp(username)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    async def generate():
+        # Like the NDJSON history stream, the export outlives the request session
+        async with SessionFactory() as session:
+            result = await session.stream(export_query(username, start, end, categories))
+            yield encoder.begin()
+            async for rows in result.partitions():
+                yield encoder.batch(rows)
+            yield encoder.end()
+
+    response = Response(generate(), mimetype=encoder.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="expenses-{username}.{encoder.extension}"'
+    return stamp.apply(response)
+
+
+@app.route('/api/weekly_expenses/<string:username>/<int:week_number>', methods=['GET'])
+async def get_weekly_expenses(username, week_number):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    week_start, week_end = week_bounds(week_number)
+    stamp = await version_stamp(username, week_start, week_end)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    expenses = (await g.session.execute(week_expenses_query(username, week_start, week_end))).all()
+    return stamp.apply(encoded_response({
+        "username": username,
+        "week_number": week_number,
+        "week_start": week_start.isoformat(),
+        "week_end": week_end.isoformat(),
+        "expenses": expense_rows(expenses),
+        "total_expenses": len(expenses)
+    })), 200
+
+
+@app.route('/api/weekly_expenses/<string:username>', methods=['GET'])
+async def get_weekly_expenses_range(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        weeks = week_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {str(e)}"}), 400
+
+    start, end = weeks[0][1], weeks[-1][2]
+    stamp = await version_stamp(username, start, end)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    rows = (await g.session.execute(
+        week_expenses_query(username, start, end).order_by(Expense.week_date, Expense.id)
+    )).all()
+    return stamp.apply(encoded_response({
+        "username": username,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "weeks": weeks_payload(rows, weeks)
+    })), 200
+
+
+@app.route('/api/dashboard/<string:username>/<int:week_number>', methods=['GET'])
+async def get_dashboard(username, week_number):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        trend_weeks = int(request.args.get('trend', DASHBOARD_TREND_WEEKS))
+    except ValueError:
+        return jsonify({"error": "trend must be a number of weeks"}), 400
+    if not 0 <= trend_weeks <= DASHBOARD_TREND_MAX:
+        return jsonify({"error": f"trend must be between 0 and {DASHBOARD_TREND_MAX}"}), 400
+
+    weeks = dashboard_weeks(week_number, trend_weeks)
+    start, end = weeks[0][1], weeks[-1][2]
+    stamp = await version_stamp(username, start, end)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    rows = (await g.session.execute(
+        week_expenses_query(username, start, end).order_by(Expense.week_date, Expense.id)
+    )).all()
+    return stamp.apply(encoded_response(dashboard_payload(username, rows, weeks))), 200
+
+
+@app.route('/api/weekly_expenses/<string:username>', methods=['POST'])
+async def save_weekly_expenses(username):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    data = await request.get_json()
+    week_number = data.get('week_number')
+    expenses = data.get('expenses', [])
+
+    if not week_number:
+        return jsonify({"error": "Week number is required"}), 400
+
+    week_start, week_end = week_bounds(week_number)
+
+    try:
+        changes = await g.session.run_sync(sync_week_expenses, username, week_start, week_end, [
+            (expense_data['category'], to_amount(expense_data['amount'])) for expense_data in expenses
+        ])
+        await g.session.commit()
+        return jsonify({"message": "Weekly expenses saved successfully", "changes": changes}), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Failed to save weekly expenses: {str(e)}"}), 500
+
+
+@app.route('/api/weekly_summary/<string:username>/<int:week_number>', methods=['GET'])
+async def get_weekly_summary(username, week_number):
+    if not await user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    week_start, week_end = week_bounds(week_number)
+    stamp = await version_stamp(username, week_start, week_end)
+    if stamp.is_fresh():
+        return stamp.not_modified(Response)
+
+    return stamp.apply(jsonify({
+        "username": username,
+        "week_number": week_number,
+        "week_start": week_start.isoformat(),
+        "week_end": week_end.isoformat(),
+        **await summarize(username, week_start, week_end)
+    })), 200
+
+
+# --- week_db.html compatibility endpoints ---
+@app.route('/api/Expenses/week/<int:week_number>', methods=['POST'])
+async def add_expenses_for_week(week_number):
+    try:
+        data = await request.get_json()
+        expenses_data = data.get('data', [])
+        week_start, week_end = week_bounds(week_number)
+
+        changes = await g.session.run_sync(sync_week_expenses, "default_user", week_start, week_end, [
+            (expense_data['label'], to_amount(expense_data['amount'])) for expense_data in expenses_data
+        ])
+        await g.session.commit()
+        return jsonify({
+            "message": f"Expenses for week {week_number} saved successfully",
+            "count": len(expenses_data),
+            "changes": changes
+        }), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": f"Failed to save expenses: {str(e)}"}), 500
+
+
+@app.route('/api/Expenses/week/<int:week_number>', methods=['GET'])
+async def get_expenses_for_week(week_number):
+    try:
+        week_start, week_end = week_bounds(week_number)
+        stamp = await version_stamp("default_user", week_start, week_end)
+        if stamp.is_fresh():
+            return stamp.not_modified(Response)
+
+        result = await g.session.execute(week_expenses_query("default_user", week_start, week_end, WEEK_ITEM_COLUMNS))
+        return stamp.apply(encoded_response({"data": expense_rows(result, WEEK_ITEM_FIELDS)})), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/Expenses/week/<int:week_number>/item/<int:item_id>', methods=['PUT'])
+async def update_expense_item(week_number, item_id):
+    try:
+        data = await request.get_json()
+        expense = await g.session.get(Expense, item_id)
+
+        if not expense:
+            return jsonify({"error": "Expense not found"}), 404
+
+        if 'label' in data:
+            expense.category = data['label']
+        if 'amount' in data:
+            expense.amount = to_amount(data['amount'])
+
+        await g.session.commit()
+        return jsonify({"message": "Expense updated successfully"}), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/Expenses/week/<int:week_number>/item/<int:item_id>', methods=['DELETE'])
+async def delete_expense_item(week_number, item_id):
+    try:
+        expense = await g.session.get(Expense, item_id)
+
+        if not expense:
+            return jsonify({"error": "Expense not found"}), 404
+
+        await g.session.delete(expense)
+        await g.session.commit()
+        return jsonify({"message": "Expense deleted successfully"}), 200
+    except Exception as e:
+        await g.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+def internal_only(view):
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        if not main.internal_token_valid(request.headers):
+            return jsonify({"error": "Forbidden"}), 403
+        return await view(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/api/internal/identity_cache', methods=['GET'])
+@internal_only
+async def identity_cache_stats():
+    return jsonify(user_cache.stats()), 200
+
+
+@app.route('/api/internal/compression', methods=['GET'])
+@internal_only
+async def compression_stats():
+    return jsonify(response_compression.stats()), 200
+
+
+@app.route('/api/internal/pool', methods=['GET'])
+@internal_only
+async def pool_stats():
+    return jsonify(pooling.pool_status(engine.sync_engine.pool)), 200
+
+
+@app.route('/api/internal/slow_queries', methods=['GET'])
+@internal_only
+async def slow_query_entries():
+    slow_query_log = main.slow_query_log
+    return jsonify({
+        "threshold_ms": slow_query_log.threshold * 1000,
+        "total": slow_query_log.total,
+        "queries": slow_query_log.entries()
+    }), 200
+
+
+@app.route('/api/internal/slow_queries', methods=['DELETE'])
+@internal_only
+async def clear_slow_queries():
+    main.slow_query_log.clear()
+    return jsonify({"message": "Slow query log cleared"}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+@internal_only
+async def prometheus_metrics():
+    return Response(main.metrics_text({'primary': engine.sync_engine.pool}), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""End-to-end load and latency benchmark for every /api route.
+
+Boots main.py in-process against a local database (a throwaway SQLite file
+by default, or any DATABASE_URL such as a local PostgreSQL), applies the
+migrations, seeds users and expenses at the requested scale and drives each
+route under concurrent load through a real HTTP server. For every route it
+reports requests/sec, p50/p95/p99 latency and SQL statements per request.
+
+    python benchmarks/api_benchmark.py --rows 100000
+    python benchmarks/api_benchmark.py --rows 1000000 --save-baseline benchmarks/baseline.json
+    python benchmarks/api_benchmark.py --rows 1000000 --compare benchmarks/baseline.json
+
+--compare exits with status 1 when any route regressed by more than
+--tolerance percent in throughput or p95 latency.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import run_load
+
+CATEGORIES = ['Food', 'Travel', 'Rent', 'Utilities', 'Health', 'Shopping', 'Fun', 'Education']
+PASSWORD = 'bench-password'
+SEED_BATCH = 10000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to benchmark against (default: temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=100, help='Users to seed')
+    parser.add_argument('--rows', type=int, default=10000, help='Expense rows to seed across all users')
+    parser.add_argument('--weeks', type=int, default=104, help='Spread seeded expenses over this many past weeks')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client connections')
+    parser.add_argument('--routes', help='Comma separated subset of routes to run')
+    parser.add_argument('--reuse', action='store_true', help='Skip seeding when the database already has data')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write results to a baseline JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='Compare results against a baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=15.0, help='Allowed regression in percent')
+    return parser.parse_args()
+
+
+def boot(database_url):
+    """Import main.py against database_url and bring its schema up to date"""
+    os.environ['DATABASE_URL'] = database_url
+    import main
+    with main.app.app_context():
+        main.migrations.upgrade(main.db.engine, echo=lambda message: None)
+    return main
+
+
+def seed(main, users, rows, weeks, reuse):
+    from sqlalchemy import func, insert, select
+
+    with main.app.app_context():
+        db = main.db
+        if reuse and db.session.execute(select(func.count(main.Expense.id))).scalar():
+            print("Reusing existing data")
+            return
+
+        password = main.password_hasher.hash(PASSWORD)
+        db.session.execute(insert(main.User), [
+            {"username": f"bench_{i}", "password": password} for i in range(users)
+        ] + [{"username": "default_user", "password": password}])
+        db.session.commit()
+
+        rng = random.Random(42)
+        today = date.today()
+        written = 0
+        started = time.perf_counter()
+        while written < rows:
+            batch = min(SEED_BATCH, rows - written)
+            db.session.execute(insert(main.Expense.__table__), [
+                {
+                    "username": f"bench_{rng.randrange(users)}",
+                    "category": rng.choice(CATEGORIES),
+                    "amount": round(rng.uniform(1, 500), 2),
+                    "week_date": today - timedelta(days=rng.randrange(weeks * 7)),
+                }
+                for _ in range(batch)
+            ])
+            db.session.commit()
+            written += batch
+            print(f"\rSeeded {written}/{rows} expenses", end='', flush=True)
+        print(f" in {time.perf_counter() - started:.1f}s")
+        print(f"Built {main.rebuild_rollup()} rollup rows")
+
+
+def serve(main):
+    """Run the app on a free local port in a background thread"""
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def scenarios(users, rows, total, current_week):
+    rng = random.Random(7)
+    # Each delete run removes its own slice of ids so repeated runs keep finding rows
+    deleted = iter(rng.sample(range(1, rows + 1), min(total, rows)))
+    run_id = int(time.time())
+
+    def user():
+        return f"bench_{rng.randrange(users)}"
+
+    def week():
+        return rng.randint(1, current_week)
+
+    def expenses():
+        return [
+            {"category": rng.choice(CATEGORIES), "amount": round(rng.uniform(1, 500), 2)}
+            for _ in range(rng.randint(3, 12))
+        ]
+
+    return {
+        'signup': lambda: [
+            ("POST", "/api/signup", {"username": f"new_{run_id}_{i}", "password": PASSWORD}) for i in range(total)
+        ],
+        'login': lambda: [("POST", "/api/login", {"username": user(), "password": PASSWORD}) for _ in range(total)],
+        'add_expense': lambda: [
+            ("POST", "/api/add_expense", {
+                "username": user(), "category": rng.choice(CATEGORIES),
+                "amount": round(rng.uniform(1, 500), 2), "week_date": date.today().isoformat()
+            }) for _ in range(total)
+        ],
+        'get_expenses': lambda: [("GET", f"/api/get_expenses/{user()}", None) for _ in range(total)],
+        'get_expenses_page': lambda: [("GET", f"/api/get_expenses/{user()}?limit=100", None) for _ in range(total)],
+        'weekly_summary': lambda: [("GET", f"/api/weekly_summary/{user()}", None) for _ in range(total)],
+        'summary_quarter': lambda: [("GET", f"/api/summary/{user()}?period=quarter", None) for _ in range(total)],
+        'analytics_year': lambda: [("GET", f"/api/analytics/{user()}?range=1y", None) for _ in range(total)],
+        'get_weekly_expenses': lambda: [
+            ("GET", f"/api/weekly_expenses/{user()}/{week()}", None) for _ in range(total)
+        ],
+        'get_weekly_summary': lambda: [
+            ("GET", f"/api/weekly_summary/{user()}/{week()}", None) for _ in range(total)
+        ],
+        'save_weekly_expenses': lambda: [
+            ("POST", f"/api/weekly_expenses/{user()}", {"week_number": week(), "expenses": expenses()})
+            for _ in range(total)
+        ],
+        'update_expense': lambda: [
+            ("PUT", f"/api/expenses/{rng.randint(1, rows)}", {"amount": round(rng.uniform(1, 500), 2)})
+            for _ in range(total)
+        ],
+        'batch': lambda: [
+            ("POST", "/api/batch", {"operations": [
+                {"op": "update", "id": expense_id, "amount": round(rng.uniform(1, 500), 2)}
+                for expense_id in rng.sample(range(1, rows + 1), min(10, rows))
+            ]}) for _ in range(total)
+        ],
+        'delete_expense': lambda: [("DELETE", f"/api/expenses/{next(deleted, 0)}", None) for _ in range(total)],
+        'week_compat_get': lambda: [("GET", f"/api/Expenses/week/{week()}", None) for _ in range(total)],
+        'week_compat_save': lambda: [
+            ("POST", f"/api/Expenses/week/{week()}", {
+                "data": [{"label": e["category"], "amount": e["amount"]} for e in expenses()]
+            }) for _ in range(total)
+        ],
+    }
+
+
+def count_queries(main):
+    """Attach a statement counter to the app's engine and return it"""
+    from sqlalchemy import event
+    counter = {"statements": 0}
+    lock = threading.Lock()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        with lock:
+            counter["statements"] += 1
+
+    with main.app.app_context():
+        event.listen(main.db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
+
+
+def compare(results, baseline, tolerance):
+    """Print per-route deltas against a baseline; return True when nothing regressed"""
+    ok = True
+    print(f"\n{'route':<22}{'req/s':>18}{'p95 ms':>18}")
+    for route, result in results.items():
+        base = baseline.get(route)
+        if not base:
+            continue
+        rps_delta = (result['rps'] - base['rps']) / base['rps'] * 100 if base['rps'] else 0.0
+        p95_delta = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+        regressed = rps_delta < -tolerance or p95_delta > tolerance
+        ok = ok and not regressed
+        print(f"{route:<22}{rps_delta:>+17.1f}%{p95_delta:>+17.1f}%{'  REGRESSED' if regressed else ''}")
+    return ok
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    print(f"Database: {database_url}")
+
+    app_module = boot(database_url)
+    seed(app_module, args.users, args.rows, args.weeks, args.reuse)
+    counter = count_queries(app_module)
+    server, base_url = serve(app_module)
+
+    current_week = (date.today() - date.today().replace(month=1, day=1)).days // 7 + 1
+    routes = scenarios(args.users, args.rows, args.requests, current_week)
+    selected = args.routes.split(',') if args.routes else list(routes)
+
+    results = {}
+    print(f"\n{'route':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'errors':>8}")
+    for route in selected:
+        requests = routes[route]()
+        counter["statements"] = 0
+        result = run_load(base_url, requests, args.concurrency).as_dict()
+        result["queries_per_request"] = round(counter["statements"] / len(requests), 2)
+        results[route] = result
+        print(f"{route:<22}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['p99_ms']:>10.1f}{result['queries_per_request']:>10.2f}{result['errors']:>8}")
+    server.shutdown()
+
+    report = {
+        "config": {"rows": args.rows, "users": args.users, "requests": args.requests,
+                   "concurrency": args.concurrency, "database": database_url.split(':', 1)[0]},
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
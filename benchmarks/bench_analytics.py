@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Latency of /api/analytics against a fixed budget.
+
+Seeds one user with several years of daily expenses into a temporary SQLite
+database, builds the weekly rollup and times the analytics endpoint end to
+end (query, NumPy pass and JSON encoding) through the Flask test client,
+next to the compute step on its own:
+
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --years 5 --budget-ms 50 --requests 200
+
+Exits with status 1 when the endpoint's p95 latency is over --budget-ms.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ['Food', 'Travel', 'Rent', 'Utilities', 'Health', 'Shopping', 'Fun', 'Education']
+
+
+def seed(main, years, per_day):
+    from sqlalchemy import insert
+    rng = random.Random(42)
+    main.db.session.execute(insert(main.User), [{"username": "bench", "password": "x"}])
+    today = date.today()
+    days = years * 365
+    rows = [
+        {
+            "username": "bench",
+            "category": rng.choice(CATEGORIES),
+            "amount": round(rng.uniform(1, 500), 2),
+            "week_date": today - timedelta(days=day),
+        }
+        for day in range(days) for _ in range(per_day)
+    ]
+    for start in range(0, len(rows), 10000):
+        main.db.session.execute(insert(main.Expense.__table__), rows[start:start + 10000])
+    main.db.session.commit()
+    return len(rows), main.rebuild_rollup()
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def timed(requests, fn):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=5, help='Years of history to seed and analyse')
+    parser.add_argument('--per-day', type=int, default=6, help='Expenses seeded per day')
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per variant')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='p95 latency budget for the endpoint')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'analytics.db')}"
+    import main
+    import analytics
+
+    main.app.app_context().push()
+    main.migrations.upgrade(main.db.engine, echo=lambda message: None)
+    expenses, rollup_rows = seed(main, args.years, args.per_day)
+    client = main.app.test_client()
+    url = f"/api/analytics/bench?range={args.years}y"
+
+    start, end = analytics.range_bounds(f"{args.years}y")
+    rows = main.db.session.execute(main.analytics_query('bench', start, end)).all()
+
+    def endpoint():
+        response = client.get(url)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    endpoint()
+    variants = [
+        ('endpoint', timed(args.requests, endpoint)),
+        ('compute', timed(args.requests, lambda: main.analytics_report(rows, start, end, analytics.DEFAULT_WINDOW))),
+    ]
+    print(f"expenses: {expenses}, rollup rows: {rollup_rows}, weeks: {(end - start).days // 7 + 1}")
+    print(f"{'variant':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, timings in variants:
+        print(f"{name:<12}{statistics.median(timings):>10.2f}{percentile(timings, 0.95):>10.2f}{max(timings):>10.2f}")
+
+    p95 = percentile(variants[0][1], 0.95)
+    if p95 > args.budget_ms:
+        print(f"FAIL: endpoint p95 {p95:.2f} ms is over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"OK: endpoint p95 {p95:.2f} ms is within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    main()
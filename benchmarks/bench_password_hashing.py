@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Login throughput at different password hashing costs and pool sizes.
+
+Simulates concurrent logins by verifying a stored hash from many request
+threads at once, the way Flask worker threads would. Pool size 0 runs the
+hash inline in the request thread (the old behaviour).
+
+    python benchmarks/bench_password_hashing.py
+    python benchmarks/bench_password_hashing.py --methods pbkdf2:sha256:600000 --pools 0,4 --logins 400
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher
+
+DEFAULT_METHODS = 'pbkdf2:sha256:100000,pbkdf2:sha256:600000,scrypt:16384:8:1,scrypt:32768:8:1'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(method, workers, logins, concurrency):
+    hasher = PasswordHasher(method=method, workers=workers)
+    stored = hasher.hash('correct horse battery staple')
+    # Warm the pool so process start-up is not counted
+    for _ in range(max(workers, 1)):
+        hasher.verify(stored, 'correct horse battery staple')
+
+    def login(_):
+        start = time.perf_counter()
+        assert hasher.verify(stored, 'correct horse battery staple')
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        latencies = list(threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+    return logins / elapsed, percentile(latencies, 50), percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', default=DEFAULT_METHODS, help='Comma separated werkzeug hash methods')
+    parser.add_argument('--pools', default=f"0,1,2,{os.cpu_count() or 1}", help='Comma separated pool sizes')
+    parser.add_argument('--logins', type=int, default=200, help='Logins per run')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent request threads')
+    args = parser.parse_args()
+
+    print(f"{'method':<24}{'pool':>6}{'logins/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for method in args.methods.split(','):
+        for workers in sorted({int(p) for p in args.pools.split(',')}):
+            throughput, p50, p95 = run(method, workers, args.logins, args.concurrency)
+            print(f"{method:<24}{workers:>6}{throughput:>12.1f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
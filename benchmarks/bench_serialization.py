@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Rows/sec for the expense list endpoints: ORM objects vs column tuples.
+
+Seeds one user's history into a temporary SQLite database and times the
+full read-and-encode path three ways:
+
+    orm+jsonify   select(Expense), to_dict() per row, Flask's JSON provider (the old path)
+    rows+json     column tuples through serialization.dumps_json (orjson when installed)
+    rows+msgpack  column tuples through MessagePack (needs msgpack)
+
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --rows 500000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(main, rows):
+    from sqlalchemy import insert
+    rng = random.Random(42)
+    main.db.session.execute(insert(main.User), [{"username": "bench", "password": "x"}])
+    for start in range(0, rows, 10000):
+        main.db.session.execute(insert(main.Expense.__table__), [
+            {
+                "username": "bench",
+                "category": rng.choice(['Food', 'Travel', 'Rent', 'Utilities']),
+                "amount": round(rng.uniform(1, 500), 2),
+                "week_date": date.today() - timedelta(days=rng.randrange(730)),
+            }
+            for _ in range(min(10000, rows - start))
+        ])
+    main.db.session.commit()
+
+
+def best_of(repeat, fn, session):
+    timings, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn())
+        timings.append(time.perf_counter() - start)
+        # Each run should load fresh objects, not reuse the identity map
+        session.expunge_all()
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='Expenses in the benchmarked history')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per variant; the fastest is reported')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serialization.db')}"
+    import main
+    from sqlalchemy import select
+    import serialization
+
+    main.app.app_context().push()
+    main.migrations.upgrade(main.db.engine, echo=lambda message: None)
+    seed(main, args.rows)
+
+    def orm_jsonify():
+        expenses = main.db.session.execute(select(main.Expense).where(main.Expense.username == 'bench')).scalars()
+        return main.app.json.dumps({"expenses": [e.to_dict() for e in expenses]}).encode()
+
+    def rows_json():
+        rows = main.db.session.execute(main.expense_history_query('bench')).all()
+        return serialization.dumps_json({"expenses": main.expense_rows(rows)})
+
+    def rows_msgpack():
+        rows = main.db.session.execute(main.expense_history_query('bench')).all()
+        return serialization.dumps_msgpack({"expenses": main.expense_rows(rows)})
+
+    variants = [('orm+jsonify', orm_jsonify), ('rows+json', rows_json)]
+    if serialization.msgpack is not None:
+        variants.append(('rows+msgpack', rows_msgpack))
+    print(f"encoder: {'orjson' if serialization.orjson else 'json'}, rows: {args.rows}")
+    print(f"{'variant':<16}{'rows/s':>12}{'ms':>10}{'bytes':>12}{'speedup':>10}")
+    baseline = None
+    for name, fn in variants:
+        elapsed, size = best_of(args.repeat, fn, main.db.session)
+        baseline = baseline or elapsed
+        print(f"{name:<16}{args.rows / elapsed:>12.0f}{elapsed * 1000:>10.1f}{size:>12}{baseline / elapsed:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Compare the sync Flask app with the ASGI app under the same read load.
+
+Start both servers against the same database first, for example:
+
+    DATABASE_URL=... flask --app main run --port 5003 --with-threads
+    DATABASE_URL=... hypercorn asgi:app --bind 127.0.0.1:5004
+
+then point this script at them with a user that already has expenses:
+
+    python benchmarks/compare_serving_modes.py --username alice --week 10
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import run_load
+
+
+def read_mix(username, week, total):
+    paths = [
+        f"/api/get_expenses/{username}?limit=50",
+        f"/api/weekly_expenses/{username}/{week}",
+        f"/api/weekly_summary/{username}/{week}",
+        f"/api/summary/{username}?period=month",
+    ]
+    return [("GET", paths[i % len(paths)], None) for i in range(total)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sync-url', default='http://127.0.0.1:5003')
+    parser.add_argument('--async-url', default='http://127.0.0.1:5004')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--week', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', default='10,50,200', help='Comma separated client concurrency levels')
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        for mode, url in (('sync', args.sync_url), ('async', args.async_url)):
+            result = run_load(url, read_mix(args.username, args.week, args.requests), concurrency)
+            print(f"{mode:<8}{concurrency:>6}{result.rps:>10.1f}{result.percentile(50):>10.1f}"
+                  f"{result.percentile(95):>10.1f}{result.percentile(99):>10.1f}{result.errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
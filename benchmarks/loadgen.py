@@ -0,0 +1,87 @@
+"""Small threaded HTTP load generator shared by the benchmark scripts.
+
+Each worker thread keeps one keep-alive connection open and pulls requests
+from a shared queue, recording the latency of every response.
+"""
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class LoadResult:
+    def __init__(self, latencies, errors, elapsed):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def rps(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct):
+        """Latency in milliseconds at the given percentile"""
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(len(self.latencies) * pct / 100))
+        return self.latencies[index] * 1000
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.rps, 1),
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+        }
+
+
+def run_load(base_url, requests, concurrency):
+    """Send requests, a list of (method, path, json_body) tuples, with the given concurrency.
+
+    Responses with status >= 500 and connection failures count as errors.
+    """
+    url = urlsplit(base_url)
+    pending = iter(requests)
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def worker():
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        while True:
+            with lock:
+                item = next(pending, None)
+            if item is None:
+                break
+            method, path, body = item
+            payload = json.dumps(body) if body is not None else None
+            headers = {"Content-Type": "application/json"} if payload else {}
+            start = time.perf_counter()
+            try:
+                conn.request(method, url.path.rstrip('/') + path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                failed = response.status >= 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return LoadResult(latencies, errors[0], time.perf_counter() - start)
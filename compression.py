@@ -0,0 +1,176 @@
+"""Negotiated compression of API responses.
+
+Expense lists repeat the same keys and usernames on every row, so they
+shrink several times over when compressed. ResponseCompression picks zstd
+(when the zstandard package is installed) or gzip from the request's
+Accept-Encoding and compresses bodies of compressible types:
+
+    buffered   bodies of at least ``min_size`` bytes are compressed whole;
+               smaller ones are sent as they are, since the saving would
+               not pay for the CPU time and the framing
+    streamed   chunks are compressed as they are produced and flushed once
+               ``flush_size`` bytes are pending, so NDJSON and export streams
+               still reach the client batch by batch without paying a flush
+               for every row
+
+Every compressed response is counted per encoding: bytes in, bytes out and
+the CPU time spent compressing. /metrics reports them so that the levels
+and the threshold can be tuned against latency.
+"""
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import metrics
+
+IDENTITY = 'identity'
+DEFAULT_LEVELS = {'zstd': 3, 'gzip': 6}
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/msgpack', 'application/x-msgpack',
+    'application/xml', 'application/javascript',
+)
+
+
+def compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES)
+
+
+class Stream:
+    """Incremental compressor for one response; also measures its own CPU time.
+
+    With a ``flush_size`` the output is flushed whenever that many input
+    bytes have arrived since the last flush, so the client can decode
+    everything sent so far.
+    """
+
+    def __init__(self, encoding, level, flush_size=0):
+        self.encoding = encoding
+        self.flush_size = flush_size
+        self._pending = 0
+        if encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            # wbits 31 writes the gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def compress(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        started = time.thread_time()
+        out = self._compressor.compress(chunk)
+        self._pending += len(chunk)
+        if self.flush_size and self._pending >= self.flush_size:
+            out += self._compressor.flush(self._flush_mode)
+            self._pending = 0
+        self.cpu_time += time.thread_time() - started
+        self.bytes_in += len(chunk)
+        self.bytes_out += len(out)
+        return out
+
+    def finish(self):
+        started = time.thread_time()
+        out = self._compressor.flush()
+        self.cpu_time += time.thread_time() - started
+        self.bytes_out += len(out)
+        return out
+
+
+class ResponseCompression:
+    """Encoding negotiation, compressors and per-encoding counters shared by the Flask and ASGI apps"""
+
+    def __init__(self, min_size=1024, levels=None, flush_size=16384):
+        self.min_size = min_size
+        self.flush_size = flush_size
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        # Offered in order of preference
+        self.encodings = (['zstd'] if zstandard is not None else []) + ['gzip']
+        self._counters = {
+            encoding: {"responses": 0, "streamed": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+            for encoding in self.encodings
+        }
+        self.skipped_small = 0
+        self._lock = threading.Lock()
+
+    def negotiate(self, accept_encodings, mimetype):
+        """The encoding to send a mimetype body in for a werkzeug Accept-Encoding header, or None"""
+        if not compressible(mimetype):
+            return None
+        encoding = accept_encodings.best_match(self.encodings + [IDENTITY], default=IDENTITY)
+        return None if encoding == IDENTITY else encoding
+
+    def stream(self, encoding, streamed=False):
+        return Stream(encoding, self.levels[encoding], self.flush_size if streamed else 0)
+
+    def compress(self, encoding, data):
+        """Compress a whole body; None when it is under min_size and should go out as it is"""
+        if len(data) < self.min_size:
+            with self._lock:
+                self.skipped_small += 1
+            return None
+        stream = self.stream(encoding)
+        body = stream.compress(data) + stream.finish()
+        self.record(stream)
+        return body
+
+    def compress_chunks(self, encoding, chunks):
+        """Generator compressing an iterable of chunks, flushing every flush_size input bytes"""
+        stream = self.stream(encoding, streamed=True)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    out = stream.compress(chunk)
+                    if out:
+                        yield out
+            yield stream.finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self.record(stream, streamed=True)
+
+    def record(self, stream, streamed=False):
+        with self._lock:
+            counters = self._counters[stream.encoding]
+            counters["responses"] += 1
+            counters["streamed"] += streamed
+            counters["bytes_in"] += stream.bytes_in
+            counters["bytes_out"] += stream.bytes_out
+            counters["cpu_seconds"] += stream.cpu_time
+
+    def stats(self):
+        with self._lock:
+            encodings = {encoding: dict(counters) for encoding, counters in self._counters.items()}
+            skipped_small = self.skipped_small
+        for counters in encodings.values():
+            counters["ratio"] = round(counters["bytes_in"] / counters["bytes_out"], 2) if counters["bytes_out"] else None
+        return {"min_size": self.min_size, "flush_size": self.flush_size,
+                "levels": {encoding: self.levels[encoding] for encoding in self.encodings},
+                "skipped_small": skipped_small, "encodings": encodings}
+
+    def render(self):
+        """Prometheus text lines for the compression counters"""
+        stats = self.stats()
+        encodings = stats["encodings"]
+        lines = []
+        for name, key, documentation in (
+            ('http_response_compressed_total', 'responses', 'Responses sent compressed.'),
+            ('http_response_compression_input_bytes_total', 'bytes_in', 'Body bytes before compression.'),
+            ('http_response_compression_output_bytes_total', 'bytes_out', 'Body bytes after compression.'),
+            ('http_response_compression_cpu_seconds_total', 'cpu_seconds', 'CPU time spent compressing bodies.'),
+        ):
+            lines += metrics.render(name, 'counter', documentation, [
+                ({'encoding': encoding}, counters[key]) for encoding, counters in encodings.items()
+            ])
+        lines += metrics.render('http_response_compression_skipped_total', 'counter',
+                                'Compressible responses sent as they are for being under the size threshold.',
+                                [({}, stats["skipped_small"])])
+        return lines
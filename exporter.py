@@ -0,0 +1,135 @@
+"""Streaming export of expense history as CSV, Arrow IPC or Parquet.
+
+An encoder turns batches of rows (as fetched from a server-side cursor)
+into bytes as they arrive, so an export never holds more than one batch in
+memory and the response can go out with chunked transfer encoding:
+
+    encoder = exporter.encoder('csv')
+    for chunk in exporter.stream(encoder, result.partitions()):
+        ...
+
+Rows are tuples in EXPORT_FIELDS order. Arrow and Parquet keep amounts as
+decimal128(10, 2) so no precision is lost; they need pyarrow installed.
+"""
+import csv
+import io
+
+EXPORT_FIELDS = ('id', 'username', 'category', 'amount', 'week_date', 'created_at')
+FORMATS = ('csv', 'arrow', 'parquet')
+
+
+class ExportFormatError(ValueError):
+    """The requested export format is unknown or its library is not installed"""
+
+
+class CsvEncoder:
+    mimetype = 'text/csv'
+    extension = 'csv'
+
+    def begin(self):
+        return self._encode([EXPORT_FIELDS])
+
+    def batch(self, rows):
+        return self._encode(
+            (id_, username, category, amount, week_date.isoformat(), created_at.isoformat() if created_at else '')
+            for id_, username, category, amount, week_date, created_at in rows
+        )
+
+    def end(self):
+        return b''
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class _Sink:
+    """Write-only file object that hands back whatever pyarrow wrote since the last drain()"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+class ArrowEncoder:
+    """Arrow IPC stream, or Parquet with one row group per batch when ``parquet`` is set"""
+
+    def __init__(self, parquet=False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportFormatError("Arrow and Parquet exports need pyarrow installed")
+        self._pa, self._pq = pa, pq
+        self.parquet = parquet
+        self.mimetype = 'application/vnd.apache.parquet' if parquet else 'application/vnd.apache.arrow.stream'
+        self.extension = 'parquet' if parquet else 'arrow'
+        self.schema = pa.schema([
+            ('id', pa.int64()),
+            ('username', pa.string()),
+            ('category', pa.string()),
+            ('amount', pa.decimal128(10, 2)),
+            ('week_date', pa.date32()),
+            ('created_at', pa.timestamp('us')),
+        ])
+        self._sink = _Sink()
+        self._writer = None
+
+    def begin(self):
+        if self.parquet:
+            self._writer = self._pq.ParquetWriter(self._sink, self.schema, compression='snappy')
+        else:
+            self._writer = self._pa.ipc.new_stream(self._sink, self.schema)
+        return self._sink.drain()
+
+    def batch(self, rows):
+        columns = zip(*rows)
+        self._writer.write_batch(self._pa.RecordBatch.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        return self._sink.drain()
+
+    def end(self):
+        self._writer.close()
+        return self._sink.drain()
+
+
+def encoder(fmt):
+    if fmt == 'csv':
+        return CsvEncoder()
+    if fmt in ('arrow', 'parquet'):
+        return ArrowEncoder(parquet=fmt == 'parquet')
+    raise ExportFormatError(f"Unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}")
+
+
+def stream(encoder, batches):
+    """Yield the encoded export, one chunk per batch of rows"""
+    yield encoder.begin()
+    for rows in batches:
+        if rows:
+            chunk = encoder.batch(rows)
+            if chunk:
+                yield chunk
+    yield encoder.end()
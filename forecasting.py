@@ -0,0 +1,96 @@
+"""Next-week spend forecasts and anomaly flags for many series at once.
+
+A chunk of series arrives as (series, week, total) columns and is pivoted
+into a matrix with one row per (username, category) and one column per
+week, oldest first, zero where nothing was spent. Every step below is a
+NumPy operation over the whole matrix, so a chunk of thousands of series
+costs about as much as a Python loop over its weeks:
+
+    forecast   Holt's exponential smoothing with a damped trend, started at
+               each series' first week with spending. The forecast is the
+               last level plus the damped trend, never below zero.
+    anomaly    robust z-score of the last week against the weeks before it,
+               0.6745 * (x - median) / MAD, flagged above ANOMALY_THRESHOLD
+               (Iglewicz and Hoaglin's 3.5). When the MAD is zero the mean
+               absolute deviation, scaled by 1.2533, is used instead.
+
+Series with fewer than MIN_HISTORY weeks of history before the last week
+get a forecast but no score. Needs NumPy, like analytics.
+"""
+from analytics import AnalyticsUnavailable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ALPHA = 0.4
+BETA = 0.1
+PHI = 0.9
+ANOMALY_THRESHOLD = 3.5
+MIN_HISTORY = 4
+# Scores are stored and served as plain numbers, so infinity is capped
+SCORE_LIMIT = 1000.0
+
+
+def smooth(matrix, alpha=ALPHA, beta=BETA, phi=PHI):
+    """One-step-ahead damped Holt forecast for every row of matrix"""
+    n_series, n_weeks = matrix.shape
+    # Weeks before a series' first spending are not part of its history
+    first = np.where(matrix.any(axis=1), (matrix != 0).argmax(axis=1), n_weeks)
+    level = np.zeros(n_series)
+    trend = np.zeros(n_series)
+    for week in range(n_weeks):
+        values = matrix[:, week]
+        started = first == week
+        active = first < week
+        previous = level
+        level = np.where(started, values, np.where(active, alpha * values + (1 - alpha) * (level + phi * trend), level))
+        trend = np.where(active, beta * (level - previous) + (1 - beta) * phi * trend, trend)
+    return np.maximum(level + phi * trend, 0), first
+
+
+def robust_scores(matrix, first, threshold=ANOMALY_THRESHOLD, min_history=MIN_HISTORY):
+    """(baseline, score, anomaly) of each row's last week against its earlier weeks"""
+    n_series, n_weeks = matrix.shape
+    history = matrix[:, :-1].astype(np.float64, copy=True)
+    history[np.arange(n_weeks - 1) < first[:, None]] = np.nan
+    enough = (n_weeks - 1 - first) >= min_history
+    baseline = np.full(n_series, np.nan)
+    score = np.full(n_series, np.nan)
+    if enough.any():
+        history = history[enough]
+        median = np.nanmedian(history, axis=1)
+        deviation = np.abs(history - median[:, None])
+        mad = np.nanmedian(deviation, axis=1) / 0.6745
+        mean_ad = np.nanmean(deviation, axis=1) * 1.2533
+        spread = np.where(mad > 0, mad, mean_ad)
+        distance = matrix[enough, -1] - median
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Against a flat history any change is as unusual as it gets
+            scored = np.where(spread > 0, distance / np.where(spread > 0, spread, 1),
+                              np.where(distance == 0, 0.0, np.copysign(np.inf, distance)))
+        scored = np.clip(scored, -SCORE_LIMIT, SCORE_LIMIT)
+        baseline[enough] = median
+        score[enough] = scored
+    anomaly = np.abs(np.nan_to_num(score)) > threshold
+    return baseline, score, anomaly
+
+
+def score_chunk(series, weeks, totals, n_series, n_weeks):
+    """Pivot (series, week, total) columns and forecast and score every series.
+
+    ``series`` and ``weeks`` are 0-based row and column indexes; the last
+    column is the week being scored. Returns arrays (forecast, actual,
+    baseline, score, anomaly) indexed by series. Runs in worker processes,
+    so everything in and out is a plain array.
+    """
+    if np is None:
+        raise AnalyticsUnavailable("Forecasting needs numpy installed")
+    matrix = np.bincount(
+        np.asarray(series, dtype=np.int64) * n_weeks + np.asarray(weeks, dtype=np.int64),
+        weights=np.asarray(totals, dtype=np.float64), minlength=n_series * n_weeks
+    ).reshape(n_series, n_weeks).astype(np.float64, copy=False)
+    forecast, first = smooth(matrix)
+    baseline, score, anomaly = robust_scores(matrix, first)
+    return forecast, matrix[:, -1], baseline, score, anomaly
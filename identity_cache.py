@@ -0,0 +1,75 @@
+"""In-process cache of which usernames exist.
+
+Most API routes only look a user up to answer 404 for unknown names. This
+cache remembers the answer so those routes can skip the round trip to the
+database. Known users are kept for ``ttl`` seconds. Unknown names are kept
+as negative entries for the shorter ``negative_ttl``, because another
+worker process may create the user at any time.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdentityCache:
+    """Thread-safe bounded LRU mapping username -> exists, with per-entry expiry"""
+
+    def __init__(self, maxsize=10000, ttl=300.0, negative_ttl=5.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username):
+        """Return True/False for a cached answer, or None when the database must be asked"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            if entry[0]:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return entry[0]
+
+    def set(self, username, exists):
+        if self.maxsize <= 0:
+            return
+        expires = self._clock() + (self.ttl if exists else self.negative_ttl)
+        with self._lock:
+            self._entries[username] = (exists, expires)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username=None):
+        """Forget one username, or everything when called without arguments"""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,234 @@
+"""Bulk import of bank-statement files into the expenses table.
+
+Files are read in chunks so memory stays flat however long the history is:
+CSV through the csv module, Parquet through pyarrow's record batches, and
+Excel through pandas (the whole sheet is loaded, as the format requires).
+Each row is mapped onto category / amount / week_date, validated, and
+either handed to the writer or recorded as a reject with its line number
+and reason. The writer is supplied by the caller (main.write_import_chunk),
+which inserts and commits one chunk at a time.
+
+pandas/openpyxl and pyarrow are optional and only needed for Excel and
+Parquet files.
+"""
+import csv
+import io
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+CHUNK_ROWS = 10000
+FORMATS = ('csv', 'xlsx', 'parquet')
+FIELDS = ('category', 'amount', 'week_date')
+# Header names recognised without an explicit mapping, compared case-insensitively
+COLUMN_ALIASES = {
+    'category': ('category', 'label', 'description', 'payee', 'merchant', 'details'),
+    'amount': ('amount', 'debit', 'value', 'withdrawal', 'amount (inr)', 'amount (usd)'),
+    'week_date': ('week_date', 'date', 'transaction date', 'posted date', 'value date', 'booking date'),
+}
+MAX_AMOUNT = Decimal('99999999.99')
+CATEGORY_MAX_LENGTH = 100
+_AMOUNT_NOISE = re.compile(r'[\s,$€£₹¥]')
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported (unknown format, unmapped columns)"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self.rejects = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "seconds": round(self.elapsed, 3),
+        }
+
+
+def detect_format(filename, fmt=None):
+    if fmt:
+        fmt = fmt.lower()
+    elif filename:
+        fmt = filename.rsplit('.', 1)[-1].lower()
+        fmt = {'xls': 'xlsx', 'pq': 'parquet', 'txt': 'csv'}.get(fmt, fmt)
+    else:
+        fmt = 'csv'
+    if fmt not in FORMATS:
+        raise ImportFileError(f"Unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def read_chunks(stream, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Yield (header, [(line_number, row_dict), ...]) chunks from a binary file object"""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        chunk, yielded = [], False
+        for row in reader:
+            chunk.append((reader.line_num, row))
+            if len(chunk) >= chunk_rows:
+                yield reader.fieldnames, chunk
+                chunk, yielded = [], True
+        if chunk or not yielded:
+            # Always yield once so an empty or header-only file still gets its columns checked
+            yield reader.fieldnames or [], chunk
+    elif fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportFileError("Parquet import needs pyarrow installed")
+        parquet = pq.ParquetFile(stream)
+        line = 1
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            rows = batch.to_pylist()
+            yield parquet.schema_arrow.names, list(enumerate(rows, start=line + 1))
+            line += len(rows)
+    else:
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportFileError("Excel import needs pandas and openpyxl installed")
+        frame = pd.read_excel(stream, dtype=object)
+        header = [str(name) for name in frame.columns]
+        frame.columns = header
+        for start in range(0, len(frame), chunk_rows):
+            rows = frame.iloc[start:start + chunk_rows].to_dict('records')
+            yield header, list(enumerate(rows, start=start + 2))
+
+
+class RowParser:
+    """Maps raw rows onto (category, amount, week_date).
+
+    ``mapping`` maps a field to the source column name; fields left out are
+    found through COLUMN_ALIASES. ``date_format`` is a strptime format; by
+    default dates must be ISO 8601 (YYYY-MM-DD).
+    """
+
+    def __init__(self, mapping=None, date_format=None):
+        self.mapping = dict(mapping or {})
+        unknown = set(self.mapping) - set(FIELDS)
+        if unknown:
+            raise ImportFileError(f"Unknown field {', '.join(sorted(unknown))}; map one of {', '.join(FIELDS)}")
+        self.date_format = date_format
+        self.columns = None
+        self._dates = {}
+
+    def resolve(self, header):
+        """Pick the source column for every field, or raise ImportFileError"""
+        by_name = {str(name).strip().lower(): name for name in header}
+        columns = {}
+        for field in FIELDS:
+            wanted = self.mapping.get(field)
+            if wanted is not None:
+                source = by_name.get(str(wanted).strip().lower())
+            else:
+                source = next((by_name[alias] for alias in COLUMN_ALIASES[field] if alias in by_name), None)
+            if source is None:
+                raise ImportFileError(
+                    f"No column for {field}" + (f" (looked for {wanted!r})" if wanted else "") +
+                    f"; file has {', '.join(map(str, header)) or 'no header'}"
+                )
+            columns[field] = source
+        self.columns = columns
+        return columns
+
+    def parse(self, row):
+        """Return (category, amount, week_date) or raise ValueError with the reason"""
+        category = row.get(self.columns['category'])
+        category = str(category).strip() if category is not None else ''
+        if not category or category.lower() == 'nan':
+            raise ValueError("category is empty")
+        if len(category) > CATEGORY_MAX_LENGTH:
+            raise ValueError(f"category is longer than {CATEGORY_MAX_LENGTH} characters")
+        return category, self.parse_amount(row.get(self.columns['amount'])), \
+            self.parse_date(row.get(self.columns['week_date']))
+
+    def parse_amount(self, value):
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            text = str(value)
+        else:
+            text = _AMOUNT_NOISE.sub('', str(value or ''))
+            if text.startswith('(') and text.endswith(')'):
+                # Accounting style negative
+                text = '-' + text[1:-1]
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            amount = None
+        if amount is None or not amount.is_finite():
+            raise ValueError(f"amount {value!r} is not a number")
+        if abs(amount) > MAX_AMOUNT:
+            raise ValueError(f"amount {value!r} is out of range")
+        return amount.quantize(Decimal('0.01'))
+
+    def parse_date(self, value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        text = str(value or '').strip()
+        # Statements repeat the same few hundred dates; parse each once
+        parsed = self._dates.get(text)
+        if parsed is None:
+            try:
+                if self.date_format:
+                    parsed = datetime.strptime(text, self.date_format).date()
+                else:
+                    parsed = date.fromisoformat(text[:10])
+            except ValueError:
+                raise ValueError(f"date {value!r} does not match {self.date_format or 'YYYY-MM-DD'}")
+            self._dates[text] = parsed
+        return parsed
+
+
+def import_chunks(chunks, parser, write_chunk, rejects=None, keep_rejects=100):
+    """Parse and write every chunk, yielding the running ImportResult after each one.
+
+    ``write_chunk(rows)`` receives lists of (category, amount, week_date).
+    ``rejects`` is an optional csv.writer that gets one line per rejected
+    row; the first ``keep_rejects`` rejects are also kept on the result.
+    """
+    result = ImportResult()
+    for header, chunk in chunks:
+        if parser.columns is None:
+            parser.resolve(header)
+            if rejects is not None:
+                rejects.writerow(['line', 'error'] + [str(name) for name in header])
+        rows = []
+        for line, raw in chunk:
+            try:
+                rows.append(parser.parse(raw))
+            except ValueError as e:
+                result.rejected += 1
+                if len(result.rejects) < keep_rejects:
+                    result.rejects.append({"line": line, "error": str(e)})
+                if rejects is not None:
+                    rejects.writerow([line, str(e)] + [raw.get(name, '') for name in header])
+        if rows:
+            write_chunk(rows)
+        result.imported += len(rows)
+        result.chunks += 1
+        yield result
+
+
+def copy_rows(dbapi_connection, table, columns, rows):
+    """Load rows with PostgreSQL COPY FROM STDIN through a psycopg2 connection"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
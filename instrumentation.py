@@ -0,0 +1,106 @@
+"""Per-request latency, SQL statement counts and database time.
+
+Engine events count every statement and its duration against the request
+that issued it. A ContextVar tracks the current request, so this works for
+Flask's threads and for the ASGI app's tasks (SQLAlchemy's asyncio greenlets
+inherit the task context). Each finished request is recorded in per-route
+histograms for /metrics and summarised in a Server-Timing header, so the
+browser's network panel shows how much of a slow response was the database.
+"""
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import HistogramVec
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+request_duration = HistogramVec(
+    'http_request_duration_seconds', 'Time spent handling the request.',
+    ('method', 'route', 'status'), LATENCY_BUCKETS
+)
+request_statements = HistogramVec(
+    'http_request_sql_statements', 'SQL statements executed per request.',
+    ('method', 'route'), STATEMENT_BUCKETS
+)
+request_db_time = HistogramVec(
+    'http_request_db_seconds', 'Time spent executing SQL per request.',
+    ('method', 'route'), LATENCY_BUCKETS
+)
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('method', 'route', 'started', 'statements', 'db_time')
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def begin(method, route):
+    """Start accounting for the current request; returns a token for finish()"""
+    return _current.set(RequestStats(method, route))
+
+
+def current():
+    return _current.get()
+
+
+def finish(token, status):
+    """Stop accounting, record the request in the histograms and return its stats"""
+    stats = _current.get()
+    _current.reset(token)
+    request_duration.labels(stats.method, stats.route, status).observe(stats.elapsed)
+    request_statements.labels(stats.method, stats.route).observe(stats.statements)
+    request_db_time.labels(stats.method, stats.route).observe(stats.db_time)
+    return stats
+
+
+def server_timing(stats):
+    """Server-Timing header value splitting the request into db and app time"""
+    total = stats.elapsed * 1000
+    db = stats.db_time * 1000
+    return (
+        f'db;dur={db:.1f};desc="{stats.statements} queries", '
+        f'app;dur={max(total - db, 0):.1f}, total;dur={total:.1f}'
+    )
+
+
+def render():
+    """Exposition lines for the request histograms"""
+    return request_duration.render() + request_statements.render() + request_db_time.render()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get('statement_started')
+    if stats is not None and started:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - started.pop()
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    if context.connection is not None:
+        started = context.connection.info.get('statement_started')
+        if started:
+            started.pop()
@@ -0,0 +1,309 @@
+"""Local background jobs for work too slow to run inside a request.
+
+Jobs are rows in the ``jobs`` table, so any process sharing the database can
+submit them, report on them or run them. A JobQueue runs them on a small
+pool of threads in the current process. Each worker claims the oldest
+queued job with a conditional UPDATE, so two processes never run the same
+job. It then calls the handler registered for the job's kind and stores the
+JSON result. Handlers report progress through the Job handle, which is also
+where cancellation is noticed:
+
+    @queue.register('export')
+    def export(job, username, **params):
+        for ...:
+            job.progress(done / total)      # raises JobCancelled once cancelled
+        return {"rows": done}
+
+Finished jobs are kept for ``retention`` and then deleted along with their
+result files. Running jobs whose process stopped sending heartbeats are
+marked failed.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+logger = logging.getLogger('jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+MESSAGE_MAX_LENGTH = 200
+# Progress is written at most this often; cancellation is noticed at the same pace
+PROGRESS_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled"""
+
+
+class JobSpec:
+    def __init__(self, handler, validate=None, internal=False):
+        self.handler = handler
+        self.validate = validate
+        self.internal = internal
+
+
+class Job:
+    """What a handler gets: the job's identity plus progress reporting"""
+
+    def __init__(self, queue, id, kind, username, params):
+        self.queue = queue
+        self.id = id
+        self.kind = kind
+        self.username = username
+        self.params = params
+        self.result_file = None
+        self._reported = 0.0
+
+    def progress(self, fraction, message=None):
+        """Record progress (0..1); raises JobCancelled when the job was cancelled"""
+        now = time.monotonic()
+        if now - self._reported < PROGRESS_INTERVAL and fraction < 1:
+            return
+        self._reported = now
+        values = {"progress": min(max(float(fraction), 0.0), 1.0), "heartbeat_at": datetime.utcnow()}
+        if message is not None:
+            values["message"] = message[:MESSAGE_MAX_LENGTH]
+        if not self.queue._update(self.id, values, cancel_requested=False):
+            raise JobCancelled()
+
+    def result_path(self, extension):
+        """Path for this job's result file, removed with the job when it expires"""
+        os.makedirs(self.queue.result_dir, exist_ok=True)
+        self.result_file = f"{self.id}.{extension}"
+        return os.path.join(self.queue.result_dir, self.result_file)
+
+
+class JobQueue:
+    """Database-backed job queue with ``workers`` threads in this process.
+
+    ``engine`` is a callable returning the Engine, and ``context`` a
+    context manager factory every database call and handler runs in (the
+    Flask app context). ``workers=0`` starts no threads; run_pending() then
+    runs queued jobs in the calling thread.
+    """
+
+    def __init__(self, table, engine, context=contextlib.nullcontext, workers=2, poll_interval=1.0,
+                 retention=timedelta(hours=24), stale_after=timedelta(minutes=5), result_dir='job_results'):
+        self.table = table
+        self.engine = engine
+        self.context = context
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.stale_after = stale_after
+        self.result_dir = result_dir
+        self.specs = {}
+        self._running = set()
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, kind, validate=None, internal=False):
+        """Decorator registering handler(job, username, **params) for kind"""
+        def decorator(handler):
+            self.specs[kind] = JobSpec(handler, validate, internal)
+            return handler
+        return decorator
+
+    # --- Submitting and inspecting ---
+    def submit(self, kind, params=None, username=None):
+        """Queue a job and return its id; raises ValueError for unknown kinds or invalid params"""
+        spec = self.specs.get(kind)
+        if spec is None:
+            raise ValueError(f"Unknown job kind {kind!r}; expected one of {', '.join(sorted(self.specs))}")
+        params = dict(params or {})
+        if spec.validate:
+            spec.validate(params)
+        job_id = uuid.uuid4().hex
+        with self.context(), self.engine().begin() as conn:
+            conn.execute(self.table.insert().values(
+                id=job_id, kind=kind, username=username, params=json.dumps(params), status=QUEUED,
+                progress=0.0, cancel_requested=False, created_at=datetime.utcnow()
+            ))
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """The job as a dict, or None"""
+        with self.context(), self.engine().connect() as conn:
+            row = conn.execute(select(self.table).where(self.table.c.id == job_id)).mappings().first()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job; returns its status afterwards, 'cancelling' while a handler winds down, or None"""
+        now = datetime.utcnow()
+        if self._update(job_id, {"status": CANCELLED, "finished_at": now, "expires_at": now + self.retention},
+                        status=QUEUED):
+            return CANCELLED
+        if self._update(job_id, {"cancel_requested": True}, status=RUNNING):
+            return 'cancelling'
+        job = self.get(job_id)
+        return job["status"] if job else None
+
+    def result_file_path(self, job):
+        return os.path.join(self.result_dir, job["result_file"]) if job.get("result_file") else None
+
+    # --- Workers ---
+    def start(self):
+        """Start the worker and maintenance threads once"""
+        if not self.workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True) for i in range(self.workers)
+            ] + [threading.Thread(target=self._maintain, name='job-maintenance', daemon=True)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def run_pending(self):
+        """Run queued jobs in this thread until none are left; returns how many ran"""
+        ran = 0
+        while self.run_next():
+            ran += 1
+        return ran
+
+    def run_next(self):
+        """Claim and run the oldest queued job; False when there was none"""
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        self._run(claimed)
+        return True
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_next():
+                    continue
+            except Exception:
+                logger.exception("Job worker failed to claim a job")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _maintain(self):
+        while not self._stop.wait(self.poll_interval * 5):
+            try:
+                self.heartbeat()
+                self.sweep()
+            except Exception:
+                logger.exception("Job maintenance failed")
+
+    def _claim(self):
+        table = self.table
+        with self.context(), self.engine().begin() as conn:
+            while True:
+                row = conn.execute(
+                    select(table.c.id, table.c.kind, table.c.username, table.c.params)
+                    .where(table.c.status == QUEUED).order_by(table.c.created_at).limit(1)
+                ).first()
+                if row is None:
+                    return None
+                now = datetime.utcnow()
+                claimed = conn.execute(
+                    update(table).where(table.c.id == row.id, table.c.status == QUEUED)
+                    .values(status=RUNNING, started_at=now, heartbeat_at=now)
+                ).rowcount
+                if claimed:
+                    self._running.add(row.id)
+                    return row
+
+    def _run(self, row):
+        job = Job(self, row.id, row.kind, row.username, json.loads(row.params))
+        spec = self.specs.get(row.kind)
+        try:
+            if spec is None:
+                raise ValueError(f"No handler for job kind {row.kind!r} in this process")
+            with self.context():
+                result = spec.handler(job, job.username, **job.params)
+            self._finish(job, SUCCEEDED, result=result)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            self._finish(job, FAILED, message=str(e))
+        finally:
+            self._running.discard(job.id)
+
+    def _finish(self, job, status, result=None, message=None):
+        if status != SUCCEEDED and job.result_file:
+            self._remove_file(job.result_file)
+            job.result_file = None
+        now = datetime.utcnow()
+        values = {
+            "status": status, "finished_at": now, "expires_at": now + self.retention,
+            "result": json.dumps(result) if result is not None else None, "result_file": job.result_file,
+        }
+        if status == SUCCEEDED:
+            values["progress"] = 1.0
+        if message is not None:
+            values["message"] = message[:MESSAGE_MAX_LENGTH]
+        self._update(job.id, values)
+
+    def _update(self, job_id, values, **conditions):
+        """UPDATE one job where every condition column matches; True when a row changed"""
+        where = [self.table.c.id == job_id] + [self.table.c[name] == value for name, value in conditions.items()]
+        with self.context(), self.engine().begin() as conn:
+            return conn.execute(update(self.table).where(*where).values(**values)).rowcount > 0
+
+    # --- Maintenance ---
+    def heartbeat(self):
+        """Mark jobs running in this process as alive"""
+        running = list(self._running)
+        if running:
+            with self.context(), self.engine().begin() as conn:
+                conn.execute(update(self.table).where(self.table.c.id.in_(running))
+                             .values(heartbeat_at=datetime.utcnow()))
+
+    def sweep(self):
+        """Fail jobs whose worker went away and delete expired ones; returns (failed, deleted)"""
+        table = self.table
+        now = datetime.utcnow()
+        with self.context(), self.engine().begin() as conn:
+            failed = conn.execute(
+                update(table).where(table.c.status == RUNNING, table.c.heartbeat_at < now - self.stale_after)
+                .values(status=FAILED, message="Worker stopped responding", finished_at=now,
+                        expires_at=now + self.retention)
+            ).rowcount
+            expired = conn.execute(
+                select(table.c.id, table.c.result_file).where(table.c.status.in_(FINISHED), table.c.expires_at < now)
+            ).all()
+            if expired:
+                conn.execute(delete(table).where(table.c.id.in_([row.id for row in expired])))
+        for row in expired:
+            if row.result_file:
+                self._remove_file(row.result_file)
+        return failed, len(expired)
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.result_dir, name))
+        except FileNotFoundError:
+            pass
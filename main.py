@@ -1,23 +1,76 @@
 import os
-from datetime import datetime, timedelta
-from flask import Flask, jsonify, request, send_from_directory, abort
+import csv
+import time
+import hashlib
+import hmac
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+import click
+from flask import Flask, Response, g, jsonify, request, send_file, abort, stream_with_context
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import cast, delete, event, func, insert, inspect, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from werkzeug.datastructures import MultiDict
 from flask_cors import CORS
+import analytics
+import compression
+import instrumentation
+import metrics
+import migrations
+import exporter
+import forecasting
+from identity_cache import IdentityCache
+import importer
+import jobs
+from passwords import PasswordHasher
+import pooling
+import replicas
+import serialization
+from slow_queries import SlowQueryLog
+from static_assets import StaticAssets
 
 # --- App Initialization ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-app = Flask(__name__, static_folder=BASE_DIR, static_url_path='')
+# No static folder: pages are served from memory by serve_file below
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
 # --- Frontend Route (Serve HTML files) ---
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 0))
+static_assets = StaticAssets(os.environ.get('STATIC_DIR') or BASE_DIR)
+static_assets.load()
+if os.environ.get('STATIC_WATCH', '0').lower() not in ('0', 'false', 'no'):
+    static_assets.watch()
+
 @app.route('/', defaults={'path': 'mainpage.html'})
 @app.route('/<path:path>')
 def serve_file(path):
-    file_path = os.path.join(BASE_DIR, path)
-    if os.path.exists(file_path) and path.endswith('.html'):
-        return send_from_directory(BASE_DIR, path)
-    abort(404)
+    """Serve a page from the in-memory cache in the best encoding the client accepts"""
+    asset = static_assets.get(path)
+    if asset is None:
+        abort(404)
+    encoding, body, etag = asset.negotiate(request.accept_encodings)
+    response = Response(body, mimetype=asset.mimetype)
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.last_modified = asset.modified
+    # Pages are not fingerprinted, so by default browsers revalidate them and get a 304
+    if STATIC_MAX_AGE:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # --- Database Configuration ---
 DB_USER = "avnadmin"
@@ -26,12 +79,53 @@ DB_HOST = "pg-7fabea4-nikshithkyathrigi2005-3753.g.aivencloud.com"
 DB_PORT = "14586"
 DB_NAME = "defaultdb"
 
-app.config['SQLALCHEMY_DATABASE_URI'] = (
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL',
     f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pooling.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+db = SQLAlchemy(app, session_options={'class_': replicas.RoutingSession})
+
+# --- Read Replicas ---
+READ_YOUR_WRITES_COOKIE = 'primary_reads_until'
+READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+replica_set = replicas.ReplicaSet(
+    replicas.parse_urls(os.environ.get('DATABASE_REPLICA_URLS')),
+    engine_options=pooling.engine_options,
+    check_interval=float(os.environ.get('REPLICA_HEALTH_INTERVAL', 10))
+)
+
+def read_only(view):
+    """Mark a GET route whose reads may be served by a replica"""
+    view.read_only = True
+    return view
 
-db = SQLAlchemy(app)
+def reads_own_writes(cookies):
+    """Whether the client wrote within READ_YOUR_WRITES_SECONDS and must read from the primary"""
+    until = cookies.get(READ_YOUR_WRITES_COOKIE, '')
+    return until.isdigit() and int(until) > time.time()
+
+@app.before_request
+def route_reads():
+    """Send the SELECTs of read-only routes to a replica"""
+    if not replica_set or request.method not in ('GET', 'HEAD'):
+        return
+    view = app.view_functions.get(request.endpoint)
+    if getattr(view, 'read_only', False) and not reads_own_writes(request.cookies):
+        replica_set.start()
+        engine = replica_set.choose()
+        if engine is not None:
+            db.session.info['replica'] = engine
+
+@app.after_request
+def remember_writes(response):
+    """Keep a client that just wrote on the primary until replicas have caught up"""
+    if replica_set and READ_YOUR_WRITES_SECONDS and db.session.info.get('wrote'):
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, str(int(time.time()) + READ_YOUR_WRITES_SECONDS),
+                            max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite='Lax')
+    return response
 
 # --- Database Models ---
 class User(db.Model):
@@ -50,6 +144,12 @@ class User(db.Model):
 
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    # Kept in sync with migration 0002
+    __table_args__ = (
+        db.Index('ix_expenses_username_week_date', 'username', 'week_date'),
+        db.Index('ix_expenses_username_week_date_category', 'username', 'week_date', 'category',
+                 postgresql_include=['amount']),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), db.ForeignKey('users.username'), nullable=False)
     category = db.Column(db.String(100), nullable=False)
@@ -67,6 +167,1178 @@ class Expense(db.Model):
             "created_at": self.created_at.isoformat()
         }
 
+class WeeklyCategoryTotal(db.Model):
+    """Rollup of expenses per user, week_date and category, maintained on every write"""
+    __tablename__ = 'weekly_category_totals'
+    username = db.Column(db.String(80), db.ForeignKey('users.username'), primary_key=True)
+    week_date = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.Numeric(14,2), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+class ExpenseVersion(db.Model):
+    """Change counter per user and week_date, used for ETag/Last-Modified validators"""
+    __tablename__ = 'expense_versions'
+    username = db.Column(db.String(80), db.ForeignKey('users.username'), primary_key=True)
+    week_date = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+class CategoryForecast(db.Model):
+    """Next week's forecast and the last complete week's anomaly score per user and category"""
+    __tablename__ = 'category_forecasts'
+    username = db.Column(db.String(80), db.ForeignKey('users.username'), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    as_of = db.Column(db.Date, nullable=False)
+    forecast = db.Column(db.Numeric(14,2), nullable=False)
+    actual = db.Column(db.Numeric(14,2), nullable=False)
+    baseline = db.Column(db.Numeric(14,2))
+    score = db.Column(db.Float)
+    anomaly = db.Column(db.Boolean, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "category": self.category,
+            "forecast": float(self.forecast),
+            "actual": float(self.actual),
+            "baseline": float(self.baseline) if self.baseline is not None else None,
+            "score": self.score,
+            "anomaly": self.anomaly
+        }
+
+class Job(db.Model):
+    """A background job and its outcome, see jobs.py"""
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_created_at', 'status', 'created_at'),)
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    username = db.Column(db.String(80), db.ForeignKey('users.username'))
+    params = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    progress = db.Column(db.Float, nullable=False)
+    message = db.Column(db.String(200))
+    result = db.Column(db.Text)
+    result_file = db.Column(db.String(255))
+    cancel_requested = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+# --- Password Hashing ---
+password_hasher = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    workers=int(os.environ['PASSWORD_HASH_WORKERS']) if 'PASSWORD_HASH_WORKERS' in os.environ else None
+)
+
+# --- Identity Cache ---
+user_cache = IdentityCache(
+    maxsize=int(os.environ.get('IDENTITY_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('IDENTITY_CACHE_TTL', 300)),
+    negative_ttl=float(os.environ.get('IDENTITY_CACHE_NEGATIVE_TTL', 5))
+)
+
+def user_exists(username):
+    """Check a username against the identity cache, asking the database only on a miss"""
+    exists = user_cache.get(username)
+    if exists is None:
+        exists = db.session.execute(select(User.id).where(User.username == username)).first() is not None
+        user_cache.set(username, exists)
+    return exists
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.username)
+    history = inspect(target).attrs.username.history
+    for username in history.deleted or ():
+        user_cache.invalidate(username)
+
+# --- Slow Query Log ---
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', 250)),
+    size=int(os.environ.get('SLOW_QUERY_LOG_SIZE', 100)),
+    explain_rate=float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0)),
+    include_parameters=os.environ.get('SLOW_QUERY_PARAMETERS', '0').lower() not in ('0', 'false', 'no')
+)
+slow_query_log.install()
+
+# --- Date Ranges ---
+PERIOD_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+WEEK_RANGE_MAX = 53
+
+def week_bounds(week_number, year=None):
+    """Return the (start, end) dates of a week numbered from January 1st of year (default: the current year)"""
+    year = year or datetime.utcnow().year
+    week_start = date(year, 1, 1) + timedelta(weeks=week_number-1)
+    return week_start, week_start + timedelta(days=6)
+
+def parse_date(args, name):
+    """args[name] as a date; raises ValueError with a message fit for the client"""
+    try:
+        return datetime.strptime(args[name], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+def parse_whole_number(args, name, default=None):
+    """args[name] (or default when absent) as a non-negative int; raises ValueError"""
+    value = args.get(name) or default
+    if isinstance(value, str):
+        if not value.isdecimal():
+            raise ValueError(f"{name} must be a whole number")
+        value = int(value)
+    return value
+
+def week_range(args):
+    """Return [(week_number, start, end), ...] for from_week/to_week[/year] or start/end args; raises ValueError.
+
+    Week numbers past the end of the year carry on into the next one. With
+    start/end the range is cut into 7-day windows from start and the weeks
+    have no number.
+    """
+    if 'start' in args or 'end' in args:
+        if not args.get('start') or not args.get('end'):
+            raise ValueError("both start and end are required")
+        start, end = parse_date(args, 'start'), parse_date(args, 'end')
+        if start > end:
+            raise ValueError("start must not be after end")
+        count = (end - start).days // 7 + 1
+        if count > WEEK_RANGE_MAX:
+            raise ValueError(f"at most {WEEK_RANGE_MAX} weeks per request")
+        return [
+            (None, start + timedelta(weeks=i), min(start + timedelta(weeks=i, days=6), end)) for i in range(count)
+        ]
+
+    if 'from_week' not in args:
+        raise ValueError("from_week or start/end is required")
+    first = parse_whole_number(args, 'from_week')
+    last = parse_whole_number(args, 'to_week', first)
+    year = parse_whole_number(args, 'year')
+    if first < 1 or last < first:
+        raise ValueError("from_week must be at least 1 and not after to_week")
+    if last - first + 1 > WEEK_RANGE_MAX:
+        raise ValueError(f"at most {WEEK_RANGE_MAX} weeks per request")
+    try:
+        return [(number, *week_bounds(number, year)) for number in range(first, last + 1)]
+    except (ValueError, OverflowError):
+        # date() rejects years outside 1..9999
+        raise ValueError("year and weeks must fall within years 1 to 9999")
+
+def period_bounds(period, anchor=None):
+    """Return the inclusive (start, end) dates of the week, month, quarter or year containing anchor"""
+    anchor = anchor or datetime.utcnow().date()
+    if period == 'week':
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=6)
+    if period not in PERIOD_MONTHS:
+        raise ValueError(f"Unknown period '{period}'")
+
+    if period == 'month':
+        start = anchor.replace(day=1)
+    elif period == 'quarter':
+        start = anchor.replace(month=3 * ((anchor.month - 1) // 3) + 1, day=1)
+    else:
+        start = anchor.replace(month=1, day=1)
+    years, month = divmod(start.month - 1 + PERIOD_MONTHS[period], 12)
+    return start, date(start.year + years, month + 1, 1) - timedelta(days=1)
+
+# --- Aggregation ---
+def category_totals_query(username, start, end):
+    """Per-category SUM/COUNT for a date range, largest category first"""
+    total = func.sum(WeeklyCategoryTotal.total)
+    return (
+        select(
+            WeeklyCategoryTotal.category,
+            total.label('total'),
+            func.sum(WeeklyCategoryTotal.count).label('count')
+        )
+        .where(
+            WeeklyCategoryTotal.username == username,
+            WeeklyCategoryTotal.week_date >= start,
+            WeeklyCategoryTotal.week_date <= end
+        )
+        .group_by(WeeklyCategoryTotal.category)
+        .order_by(total.desc(), WeeklyCategoryTotal.category)
+    )
+
+def summarize_category_totals(rows):
+    """Build the summary payload from rows produced by category_totals_query"""
+    rows = list(rows)
+    highest = rows[0] if rows else None
+    return {
+        "category_summary": {row.category: float(row.total) for row in rows},
+        "total_amount": float(sum(row.total for row in rows)),
+        "highest_category": {
+            "category": highest.category,
+            "amount": float(highest.total)
+        } if highest else None,
+        "expense_count": sum(row.count for row in rows)
+    }
+
+def summarize_expense_rows(expenses):
+    """The summarize_category_totals payload computed from expense dicts instead of the rollup"""
+    totals, counts = {}, {}
+    for expense in expenses:
+        totals[expense["category"]] = totals.get(expense["category"], 0) + expense["amount"]
+        counts[expense["category"]] = counts.get(expense["category"], 0) + 1
+    ranked = sorted(totals, key=lambda category: (-totals[category], category))
+    return {
+        "category_summary": {category: round(totals[category], 2) for category in ranked},
+        "total_amount": round(float(sum(totals.values())), 2),
+        "highest_category": {
+            "category": ranked[0],
+            "amount": round(totals[ranked[0]], 2)
+        } if ranked else None,
+        "expense_count": sum(counts.values())
+    }
+
+def aggregate_expenses(username, start, end):
+    """Summarize a user's expenses between start and end (inclusive) in a single GROUP BY query"""
+    return summarize_category_totals(db.session.execute(category_totals_query(username, start, end)))
+
+# --- Trend Analytics ---
+ANALYTICS_MAX_WINDOW = 52
+
+def parse_analytics_args(args):
+    """Return (start, end, window) from analytics query args; raises ValueError"""
+    end = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else None
+    start, end = analytics.range_bounds(args.get('range'), end)
+    window = int(args.get('window', analytics.DEFAULT_WINDOW))
+    if not 1 <= window <= ANALYTICS_MAX_WINDOW:
+        raise ValueError(f"window must be between 1 and {ANALYTICS_MAX_WINDOW} weeks")
+    return start, end, window
+
+class epoch_week(FunctionElement):
+    """Whole weeks from analytics.EPOCH_MONDAY to a date column, as an SQL integer"""
+    type = db.Integer()
+    inherit_cache = True
+
+@compiles(epoch_week, 'postgresql')
+def _epoch_week_postgresql(element, compiler, **kw):
+    return f"(({compiler.process(element.clauses, **kw)}) - DATE '{analytics.EPOCH_MONDAY}') / 7"
+
+@compiles(epoch_week, 'sqlite')
+def _epoch_week_sqlite(element, compiler, **kw):
+    return (f"CAST(julianday({compiler.process(element.clauses, **kw)}) - "
+            f"julianday('{analytics.EPOCH_MONDAY}') AS INTEGER) / 7")
+
+def analytics_query(username, start, end):
+    """Per-week category totals (epoch week, category, total) between start (None: the first expense) and end"""
+    week = epoch_week(WeeklyCategoryTotal.week_date)
+    query = select(
+        week, WeeklyCategoryTotal.category, cast(func.sum(WeeklyCategoryTotal.total), db.Float)
+    ).where(
+        WeeklyCategoryTotal.username == username,
+        WeeklyCategoryTotal.week_date <= end,
+        WeeklyCategoryTotal.count > 0
+    ).group_by(week, WeeklyCategoryTotal.category)
+    if start is not None:
+        query = query.where(WeeklyCategoryTotal.week_date >= start)
+    return query
+
+def analytics_report(rows, start, end, window):
+    """analytics.compute() over rows from analytics_query, transposed into columns"""
+    weeks, categories, totals = zip(*rows) if rows else ((), (), ())
+    return analytics.compute(weeks, categories, totals, start, end, window)
+
+# --- Version Stamps ---
+# expense_versions holds one row per (username, week_date) that was ever written,
+# stamped with the user's version counter at the time. The row dated
+# HISTORY_STAMP_DATE carries the counter itself and stamps the whole history.
+HISTORY_STAMP_DATE = date.min
+
+def bump_versions(session, weeks):
+    """Advance each user's version counter and stamp the given (username, week_date) pairs"""
+    table = ExpenseVersion.__table__
+    now = datetime.utcnow()
+    by_user = {}
+    for username, week_date in weeks:
+        by_user.setdefault(username, set()).add(week_date)
+
+    # Users and weeks in sorted order, so concurrent commits lock the rows they share in the same order
+    for username, dates in sorted(by_user.items()):
+        counter = dialect_insert(session, table).values(
+            username=username, week_date=HISTORY_STAMP_DATE, version=1, updated_at=now
+        )
+        version = session.execute(counter.on_conflict_do_update(
+            index_elements=['username', 'week_date'],
+            set_={"version": table.c.version + 1, "updated_at": now}
+        ).returning(table.c.version)).scalar_one()
+
+        stamp = dialect_insert(session, table)
+        session.execute(stamp.on_conflict_do_update(
+            index_elements=['username', 'week_date'],
+            set_={"version": stamp.excluded.version, "updated_at": stamp.excluded.updated_at}
+        ), [
+            {"username": username, "week_date": week_date, "version": version, "updated_at": now}
+            for week_date in sorted(dates)
+        ])
+
+class VersionStamp:
+    """Validators for one cacheable response, derived from expense_versions"""
+
+    def __init__(self, req, scope, version, updated_at):
+        self.request = req
+        key = f"{scope}|{req.full_path}|{req.headers.get('Accept', '')}"
+        self.etag = f"{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+        self.last_modified = None
+        if updated_at:
+            # Last-Modified has whole seconds: stamp the end of the second updated_at fell in, and leave it
+            # out until that second is over, as a later write could still land in it
+            last_modified = updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+            if updated_at.microsecond:
+                last_modified += timedelta(seconds=1)
+            if last_modified <= datetime.now(timezone.utc):
+                self.last_modified = last_modified
+
+    def is_fresh(self):
+        """True when the client's cached copy is still current"""
+        if self.request.if_none_match:
+            return self.request.if_none_match.contains_weak(self.etag)
+        if self.request.if_modified_since and self.last_modified:
+            return self.last_modified <= self.request.if_modified_since
+        return False
+
+    def apply(self, response):
+        response.set_etag(self.etag, weak=True)
+        if self.last_modified:
+            response.last_modified = self.last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept')
+        return response
+
+    def not_modified(self, response_class=Response):
+        return self.apply(response_class(status=304))
+
+def version_query(username, start=None, end=None):
+    """Latest version and update time of a user's expenses between start and end, or their whole history"""
+    if start is None:
+        condition = ExpenseVersion.week_date == HISTORY_STAMP_DATE
+    else:
+        condition = ExpenseVersion.week_date.between(start, end)
+    return (
+        select(func.max(ExpenseVersion.version), func.max(ExpenseVersion.updated_at))
+        .where(ExpenseVersion.username == username, condition)
+    )
+
+def version_stamp(username, start=None, end=None):
+    version, updated_at = db.session.execute(version_query(username, start, end)).one()
+    return VersionStamp(request, f"{username}|{start}|{end}", version or 0, updated_at)
+
+# --- Weekly Rollup ---
+# Expense writes record (username, week_date, category) deltas on the session;
+# just before the transaction commits they are added to weekly_category_totals
+# and the touched weeks get a new version stamp.
+def to_amount(value):
+    """Normalize a submitted amount to the Numeric(10,2) value the database stores"""
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+def track_rollup(session, username, week_date, category, amount, count):
+    deltas = session.info.setdefault('rollup_deltas', {})
+    total, n = deltas.get((username, week_date, category), (Decimal('0'), 0))
+    deltas[(username, week_date, category)] = (total + to_amount(amount), n + count)
+
+def _committed_value(expense, attr):
+    history = inspect(expense).attrs[attr].history
+    return (history.deleted or history.unchanged or history.added)[0]
+
+@event.listens_for(db.session, 'before_flush')
+def track_expense_changes(session, flush_context, instances):
+    """Turn pending ORM inserts, updates and deletes of expenses into rollup deltas"""
+    for expense in session.new:
+        if isinstance(expense, Expense):
+            track_rollup(session, expense.username, expense.week_date, expense.category, expense.amount, 1)
+    for expense in session.deleted:
+        if isinstance(expense, Expense):
+            track_rollup(session, expense.username, expense.week_date, expense.category, -to_amount(expense.amount), -1)
+    for expense in session.dirty:
+        if isinstance(expense, Expense) and session.is_modified(expense):
+            old = [_committed_value(expense, attr) for attr in ('username', 'week_date', 'category', 'amount')]
+            track_rollup(session, *old[:3], -to_amount(old[3]), -1)
+            track_rollup(session, expense.username, expense.week_date, expense.category, expense.amount, 1)
+
+def dialect_insert(session, table):
+    """INSERT with on_conflict_do_update() support for the session's database"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql_insert(table)
+    if dialect == 'sqlite':
+        return sqlite_insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+def apply_rollup(session, deltas):
+    # Key order, so concurrent transactions lock overlapping rows in the same order and cannot deadlock
+    rows = [
+        {"username": key[0], "week_date": key[1], "category": key[2], "total": total, "count": count}
+        for key, (total, count) in sorted(deltas.items()) if total or count
+    ]
+    if not rows:
+        return
+
+    table = WeeklyCategoryTotal.__table__
+    upsert = dialect_insert(session, table)
+    session.execute(upsert.on_conflict_do_update(
+        index_elements=['username', 'week_date', 'category'],
+        set_={"total": table.c.total + upsert.excluded.total, "count": table.c.count + upsert.excluded.count}
+    ), rows)
+    session.execute(delete(table).where(
+        table.c.username.in_({row['username'] for row in rows}),
+        table.c.count <= 0
+    ))
+
+@event.listens_for(db.session, 'before_commit')
+def apply_tracked_changes(session):
+    session.flush()
+    deltas = session.info.pop('rollup_deltas', None)
+    if deltas:
+        apply_rollup(session, deltas)
+        bump_versions(session, {(username, week_date) for username, week_date, _ in deltas})
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def discard_tracked_changes(session, previous_transaction):
+    session.info.pop('rollup_deltas', None)
+
+def rebuild_rollup(username=None):
+    """Recompute weekly_category_totals from the expenses table, for one user or everyone"""
+    table = WeeklyCategoryTotal.__table__
+    clear = delete(table)
+    source = select(
+        Expense.username, Expense.week_date, Expense.category,
+        func.sum(Expense.amount), func.count(Expense.id)
+    ).group_by(Expense.username, Expense.week_date, Expense.category)
+    if username:
+        clear = clear.where(table.c.username == username)
+        source = source.where(Expense.username == username)
+    db.session.execute(clear)
+    result = db.session.execute(
+        insert(table).from_select(['username', 'week_date', 'category', 'total', 'count'], source)
+    )
+    db.session.commit()
+    return result.rowcount
+
+# --- Row Projections ---
+# List endpoints select plain column tuples instead of hydrating Expense
+# objects. The database casts the amount to a float, so each row becomes a
+# dict with one zip() and the encoder handles the dates.
+EXPENSE_FIELDS = ('id', 'username', 'category', 'amount', 'week_date', 'created_at')
+EXPENSE_COLUMNS = (
+    Expense.id, Expense.username, Expense.category,
+    cast(Expense.amount, db.Float).label('amount'),
+    Expense.week_date, Expense.created_at
+)
+
+# week_db.html's shape: {"label": category, "amount": amount}
+WEEK_ITEM_FIELDS = ('label', 'amount')
+WEEK_ITEM_COLUMNS = (EXPENSE_COLUMNS[2], EXPENSE_COLUMNS[3])
+
+def expense_rows(rows, fields=EXPENSE_FIELDS):
+    return [dict(zip(fields, row)) for row in rows]
+
+def week_expenses_query(username, week_start, week_end, columns=EXPENSE_COLUMNS):
+    return select(*columns).where(
+        Expense.username == username,
+        Expense.week_date >= week_start,
+        Expense.week_date <= week_end
+    )
+
+def encoded_response(payload):
+    """Response with payload as JSON, or MessagePack when the client asks for it"""
+    body, mimetype = serialization.encode(payload, request.accept_mimetypes)
+    return Response(body, mimetype=mimetype)
+
+# --- Week Ranges ---
+def weeks_payload(rows, weeks):
+    """Split expense rows (ordered by week_date) into per-week items and summaries.
+
+    ``weeks`` is week_range() output; every week is present, empty or not.
+    """
+    expenses = expense_rows(rows)
+    payload, i = [], 0
+    for number, start, end in weeks:
+        items = []
+        while i < len(expenses) and expenses[i]["week_date"] <= end:
+            if expenses[i]["week_date"] >= start:
+                items.append(expenses[i])
+            i += 1
+        payload.append({
+            "week_number": number,
+            "week_start": start.isoformat(),
+            "week_end": end.isoformat(),
+            "expenses": items,
+            "total_expenses": len(items),
+            **summarize_expense_rows(items)
+        })
+    return payload
+
+DASHBOARD_TREND_WEEKS = 4
+DASHBOARD_TREND_MAX = 12
+
+def dashboard_weeks(week_number, trend_weeks):
+    """week_range()-style windows for the trend weeks followed by week_number itself.
+
+    The trend stops at week 1, so it is shorter in the first weeks of the year.
+    """
+    first = max(week_number - trend_weeks, min(week_number, 1))
+    return [(number, *week_bounds(number)) for number in range(first, week_number + 1)]
+
+def dashboard_payload(username, rows, weeks):
+    """Items and summary of the last week in weeks, plus the totals of the weeks before it"""
+    *previous, current = weeks_payload(rows, weeks)
+    return {
+        "username": username,
+        **current,
+        "trend": [
+            {key: week[key] for key in ('week_number', 'week_start', 'week_end', 'total_amount', 'expense_count')}
+            for week in previous
+        ]
+    }
+
+# --- Expense History Paging ---
+EXPENSE_PAGE_MAX = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(expense):
+    """Keyset cursor pointing just past an expense in (week_date, id) descending order"""
+    return f"{expense.week_date.isoformat()}:{expense.id}"
+
+def decode_cursor(cursor):
+    week_date, expense_id = cursor.split(':')
+    return datetime.strptime(week_date, '%Y-%m-%d').date(), int(expense_id)
+
+def parse_page_limit(args):
+    """The page size in args['limit'], or None when absent; raises ValueError unless it is 1..EXPENSE_PAGE_MAX"""
+    if 'limit' not in args:
+        return None
+    limit = args['limit']
+    if not limit.isdecimal() or not 1 <= int(limit) <= EXPENSE_PAGE_MAX:
+        raise ValueError(f"limit must be a whole number between 1 and {EXPENSE_PAGE_MAX}")
+    return int(limit)
+
+def expense_history_query(username, after=None):
+    """A user's expense rows newest first, optionally starting after a decoded cursor"""
+    query = select(*EXPENSE_COLUMNS).where(Expense.username == username)
+    if after:
+        query = query.where(tuple_(Expense.week_date, Expense.id) < tuple_(*after))
+    return query.order_by(Expense.week_date.desc(), Expense.id.desc())
+
+# --- Weekly Saves ---
+def sync_week_expenses(session, username, week_start, week_end, items):
+    """Make the stored expenses in a week match items, writing only what changed.
+
+    items is a list of (category, amount) pairs. Stored rows with the same
+    category and amount are kept as-is; leftover rows are reused through
+    batched UPDATEs before falling back to INSERTs or DELETEs. The caller
+    commits. Returns the number of rows inserted, updated, deleted and
+    left unchanged.
+    """
+    stored = {}
+    for row in session.execute(
+        select(Expense.id, Expense.category, Expense.amount, Expense.week_date)
+        .where(
+            Expense.username == username,
+            Expense.week_date >= week_start,
+            Expense.week_date <= week_end
+        )
+        .order_by(Expense.id)
+    ):
+        stored.setdefault(row.category, []).append(row)
+
+    unchanged, changed = 0, []
+    for category, amount in items:
+        rows = stored.get(category, [])
+        match = next((row for row in rows if row.amount == amount), None)
+        if match:
+            rows.remove(match)
+            unchanged += 1
+        else:
+            changed.append((category, amount))
+
+    # Prefer rows of the same category, then any leftover row, so a re-save
+    # never costs a DELETE plus an INSERT where one UPDATE will do.
+    updates, added = [], []
+    for category, amount in changed:
+        if stored.get(category):
+            row = stored[category].pop(0)
+            updates.append({"id": row.id, "amount": amount})
+            track_rollup(session, username, row.week_date, category, amount - row.amount, 0)
+        else:
+            added.append((category, amount))
+    leftover = [row for rows in stored.values() for row in rows]
+    moves, inserts = [], []
+    for category, amount in added:
+        if leftover:
+            row = leftover.pop(0)
+            moves.append({"id": row.id, "category": category, "amount": amount})
+            track_rollup(session, username, row.week_date, row.category, -row.amount, -1)
+            track_rollup(session, username, row.week_date, category, amount, 1)
+        else:
+            inserts.append({"username": username, "category": category, "amount": amount, "week_date": week_start})
+            track_rollup(session, username, week_start, category, amount, 1)
+    for row in leftover:
+        track_rollup(session, username, row.week_date, row.category, -row.amount, -1)
+
+    # Each non-empty batch is one executemany round trip
+    if inserts:
+        session.execute(insert(Expense), inserts)
+    if updates:
+        session.execute(update(Expense), updates)
+    if moves:
+        session.execute(update(Expense), moves)
+    if leftover:
+        session.execute(delete(Expense).where(Expense.id.in_([row.id for row in leftover])))
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates) + len(moves),
+        "deleted": len(leftover),
+        "unchanged": unchanged
+    }
+
+# --- Batch Operations ---
+BATCH_MAX_OPERATIONS = 1000
+UPDATE_FIELDS = ('category', 'amount', 'week_date')
+# Length of the users.username column
+USERNAME_MAX_LENGTH = 80
+
+def parse_batch_operation(op):
+    """Validate one /api/batch operation without touching the database; raises ValueError"""
+    if not isinstance(op, dict):
+        raise ValueError("Operation must be an object")
+    kind = op.get('op')
+    parsed = {"op": kind}
+    if kind == 'add':
+        missing = [field for field in ('username', 'category', 'amount', 'week_date') if field not in op]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        if not isinstance(op['username'], str) or not op['username'] or len(op['username']) > USERNAME_MAX_LENGTH:
+            raise ValueError(f"username must be a non-empty string of at most {USERNAME_MAX_LENGTH} characters")
+        parsed["username"] = op['username']
+        fields = UPDATE_FIELDS
+    elif kind in ('update', 'delete'):
+        if not isinstance(op.get('id'), int) or isinstance(op.get('id'), bool):
+            raise ValueError("id must be an integer")
+        parsed["id"] = op['id']
+        fields = UPDATE_FIELDS if kind == 'update' else ()
+        if kind == 'update' and not any(field in op for field in fields):
+            raise ValueError(f"Nothing to update; send one of {', '.join(fields)}")
+    else:
+        raise ValueError("op must be add, update or delete")
+
+    for field in fields:
+        if field not in op:
+            continue
+        value = op[field]
+        if field == 'amount':
+            try:
+                value = to_amount(value)
+            except ArithmeticError:
+                raise ValueError("amount must be a number")
+            # Caught here rather than by Numeric(10,2) halfway through the batch
+            if not value.is_finite():
+                raise ValueError("amount must be a number")
+            if abs(value) > importer.MAX_AMOUNT:
+                raise ValueError(f"amount must be at most {importer.MAX_AMOUNT} in absolute value")
+        elif field == 'week_date':
+            try:
+                value = datetime.strptime(str(value), '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError("week_date must be a YYYY-MM-DD date")
+        elif not isinstance(value, str) or not value:
+            raise ValueError(f"{field} must be a non-empty string")
+        elif len(value) > importer.CATEGORY_MAX_LENGTH:
+            raise ValueError(f"{field} must be at most {importer.CATEGORY_MAX_LENGTH} characters")
+        parsed[field] = value
+    return parsed
+
+def parse_batch(data):
+    """Validate an /api/batch body; returns (operations, None) or (None, (error_body, status))"""
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return None, ({"error": "operations must be a non-empty list"}, 400)
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return None, ({"error": f"At most {BATCH_MAX_OPERATIONS} operations per batch"}, 400)
+
+    parsed, results = [], []
+    for index, op in enumerate(operations):
+        try:
+            parsed.append(parse_batch_operation(op))
+            results.append({"index": index, "status": "valid"})
+        except ValueError as e:
+            results.append({"index": index, "status": "invalid", "error": str(e)})
+    if len(parsed) < len(operations):
+        return None, ({"error": "Invalid operations", "results": results}, 400)
+
+    touched = [op["id"] for op in parsed if op["op"] != 'add']
+    if len(touched) != len(set(touched)):
+        return None, ({"error": "Each expense may appear in only one operation"}, 400)
+    return parsed, None
+
+def unknown_users_error(operations, unknown):
+    return {"error": "User not found", "results": [
+        {"index": index, "op": op["op"], "status": "not_found", "error": "User not found"}
+        if op["op"] == 'add' and op["username"] in unknown else {"index": index, "op": op["op"], "status": "valid"}
+        for index, op in enumerate(operations)
+    ]}
+
+def apply_expense_batch(session, operations):
+    """Apply parsed add/update/delete operations with one bulk statement per kind.
+
+    Every referenced expense is read (and locked, where supported) up front.
+    Returns (results, ok): when any operation references a missing expense,
+    nothing is written and ok is False. The caller commits.
+    """
+    ids = [op["id"] for op in operations if op["op"] != 'add']
+    stored = {
+        row.id: row for row in session.execute(
+            select(Expense.id, Expense.username, Expense.category, Expense.amount, Expense.week_date)
+            .where(Expense.id.in_(ids))
+            .with_for_update()
+        )
+    } if ids else {}
+
+    results = [{"index": index, "op": op["op"], "status": "valid"} for index, op in enumerate(operations)]
+    missing = [result for result, op in zip(results, operations) if op["op"] != 'add' and op["id"] not in stored]
+    for result in missing:
+        result.update(id=operations[result["index"]]["id"], status="not_found", error="Expense not found")
+    if missing:
+        return results, False
+
+    inserts, updates, deletes = [], [], []
+    for result, op in zip(results, operations):
+        if op["op"] == 'add':
+            inserts.append((result, {field: op[field] for field in ('username',) + UPDATE_FIELDS}))
+            track_rollup(session, op["username"], op["week_date"], op["category"], op["amount"], 1)
+            continue
+        row = stored[op["id"]]
+        track_rollup(session, row.username, row.week_date, row.category, -row.amount, -1)
+        if op["op"] == 'update':
+            changes = {field: op[field] for field in UPDATE_FIELDS if field in op}
+            updates.append({"id": row.id, **changes})
+            new = row._asdict() | changes
+            track_rollup(session, row.username, new["week_date"], new["category"], new["amount"], 1)
+            result.update(id=row.id, status="updated")
+        else:
+            deletes.append(row.id)
+            result.update(id=row.id, status="deleted")
+
+    if inserts:
+        new_ids = session.scalars(
+            insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+            [values for _, values in inserts]
+        ).all()
+        for (result, _), expense_id in zip(inserts, new_ids):
+            result.update(id=expense_id, status="created")
+    if updates:
+        session.execute(update(Expense), updates)
+    if deletes:
+        session.execute(delete(Expense).where(Expense.id.in_(deletes)))
+    return results, True
+
+# --- Bulk Import ---
+IMPORT_COLUMNS = ('username', 'category', 'amount', 'week_date', 'created_at')
+IMPORT_CHUNK_MAX = 50000
+
+def write_import_chunk(session, username, rows):
+    """Insert one chunk of parsed (category, amount, week_date) rows and commit it.
+
+    psycopg2 connections load the chunk with COPY; everything else uses one
+    executemany INSERT. Rollup deltas are summed per chunk before being recorded.
+    """
+    now = datetime.utcnow()
+    connection = session.connection()
+    if connection.dialect.driver == 'psycopg2':
+        importer.copy_rows(connection.connection.dbapi_connection, Expense.__tablename__, IMPORT_COLUMNS, (
+            (username, category, amount, week_date, now) for category, amount, week_date in rows
+        ))
+    else:
+        session.execute(insert(Expense.__table__), [
+            {"username": username, "category": category, "amount": amount, "week_date": week_date, "created_at": now}
+            for category, amount, week_date in rows
+        ])
+    totals = {}
+    for category, amount, week_date in rows:
+        total, count = totals.get((week_date, category), (0, 0))
+        totals[(week_date, category)] = (total + amount, count + 1)
+    for (week_date, category), (total, count) in totals.items():
+        track_rollup(session, username, week_date, category, total, count)
+    session.commit()
+
+# --- Export ---
+EXPORT_BATCH_SIZE = 10000
+EXPORT_COLUMNS = (Expense.id, Expense.username, Expense.category, Expense.amount, Expense.week_date, Expense.created_at)
+
+def parse_export_args(args):
+    """Return (format, start, end, categories) from export query args; raises ValueError"""
+    start = datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start') else None
+    end = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else None
+    if start and end and start > end:
+        raise ValueError("start must not be after end")
+    return args.get('format', 'csv'), start, end, args.getlist('category')
+
+def export_query(username, start=None, end=None, categories=()):
+    """A user's expenses oldest first, fetched EXPORT_BATCH_SIZE rows at a time"""
+    query = select(*EXPORT_COLUMNS).where(Expense.username == username)
+    if start:
+        query = query.where(Expense.week_date >= start)
+    if end:
+        query = query.where(Expense.week_date <= end)
+    if categories:
+        query = query.where(Expense.category.in_(categories))
+    return query.order_by(Expense.week_date, Expense.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+# --- Forecast Job ---
+# Scores every user's categories in one pass: rollup totals are streamed per
+# (username, category, week), cut into chunks of whole series and scored in a
+# process pool while the next chunk is read. The results replace the whole
+# category_forecasts table in one transaction, so readers never see a half run.
+FORECAST_HISTORY_WEEKS = 26
+FORECAST_CHUNK_SERIES = 5000
+FORECAST_FETCH_ROWS = 20000
+
+def forecast_source_query(start, end):
+    """Weekly totals of every (username, category) between start and end, grouped by series"""
+    week = epoch_week(WeeklyCategoryTotal.week_date)
+    return (
+        select(
+            WeeklyCategoryTotal.username, WeeklyCategoryTotal.category, week,
+            cast(func.sum(WeeklyCategoryTotal.total), db.Float)
+        )
+        .where(WeeklyCategoryTotal.week_date.between(start, end), WeeklyCategoryTotal.count > 0)
+        .group_by(WeeklyCategoryTotal.username, WeeklyCategoryTotal.category, week)
+        .order_by(WeeklyCategoryTotal.username, WeeklyCategoryTotal.category)
+        .execution_options(yield_per=FORECAST_FETCH_ROWS)
+    )
+
+def forecast_chunks(rows, first_week, chunk_series=FORECAST_CHUNK_SERIES):
+    """Cut rows ordered by series into (keys, series, weeks, totals) chunks of whole series"""
+    keys, series, weeks, totals = [], [], [], []
+    for username, category, week, total in rows:
+        if not keys or keys[-1] != (username, category):
+            if len(keys) >= chunk_series:
+                yield keys, series, weeks, totals
+                keys, series, weeks, totals = [], [], [], []
+            keys.append((username, category))
+        series.append(len(keys) - 1)
+        weeks.append(week - first_week)
+        totals.append(total)
+    if keys:
+        yield keys, series, weeks, totals
+
+def forecasts_payload(username, forecasts):
+    latest = forecasts[0] if forecasts else None
+    return {
+        "username": username,
+        "as_of": latest.as_of.isoformat() if latest else None,
+        "forecast_week": (latest.as_of + timedelta(weeks=1)).isoformat() if latest else None,
+        "computed_at": latest.computed_at.isoformat() if latest else None,
+        "forecasts": [forecast.to_dict() for forecast in forecasts]
+    }
+
+def write_forecasts(session, keys, scored, as_of, computed_at):
+    forecast, actual, baseline, score, anomaly = (column.tolist() for column in scored)
+    session.execute(insert(CategoryForecast.__table__), [
+        {
+            "username": username, "category": category, "as_of": as_of,
+            "forecast": round(forecast[i], 2), "actual": round(actual[i], 2),
+            "baseline": None if baseline[i] != baseline[i] else round(baseline[i], 2),
+            "score": None if score[i] != score[i] else round(score[i], 2),
+            "anomaly": anomaly[i], "computed_at": computed_at
+        }
+        for i, (username, category) in enumerate(keys)
+    ])
+    return sum(anomaly)
+
+def run_forecasts(as_of=None, weeks=FORECAST_HISTORY_WEEKS, workers=None, chunk_series=FORECAST_CHUNK_SERIES):
+    """Forecast and score every (username, category) series for the week containing as_of.
+
+    as_of defaults to the last complete week. ``workers=0`` scores inline;
+    by default there is one worker process per CPU. Returns (week start,
+    series scored, anomalies flagged).
+    """
+    as_of = analytics.week_start(as_of or datetime.utcnow().date() - timedelta(weeks=1))
+    start = as_of - timedelta(weeks=weeks - 1)
+    first_week = analytics.epoch_week(start)
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    computed_at = datetime.utcnow()
+    session = db.session
+    total_series = total_anomalies = 0
+
+    def write(keys, scored):
+        nonlocal total_series, total_anomalies
+        total_anomalies += write_forecasts(session, keys, scored, as_of, computed_at)
+        total_series += len(keys)
+
+    try:
+        session.execute(delete(CategoryForecast.__table__))
+        chunks = forecast_chunks(
+            session.execute(forecast_source_query(start, as_of + timedelta(days=6))), first_week, chunk_series
+        )
+        if not workers:
+            for keys, series, week_index, totals in chunks:
+                write(keys, forecasting.score_chunk(series, week_index, totals, len(keys), weeks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Keep a couple of chunks per worker in flight; results are written in order
+                pending = deque()
+                for keys, series, week_index, totals in chunks:
+                    pending.append((keys, pool.submit(forecasting.score_chunk, series, week_index, totals, len(keys), weeks)))
+                    if len(pending) >= 2 * workers:
+                        keys, future = pending.popleft()
+                        write(keys, future.result())
+                while pending:
+                    keys, future = pending.popleft()
+                    write(keys, future.result())
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return as_of, total_series, total_anomalies
+
+# --- Background Jobs ---
+# Heavy work is queued in the jobs table and run by job_queue's worker threads
+# (started on first use) or by `flask --app main jobs worker`.
+job_queue = jobs.JobQueue(
+    Job.__table__,
+    engine=lambda: db.engine,
+    context=app.app_context,
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    retention=timedelta(hours=float(os.environ.get('JOB_RETENTION_HOURS', 24))),
+    result_dir=os.environ.get('JOB_RESULT_DIR') or os.path.join(app.instance_path, 'job_results')
+)
+
+def job_args(params):
+    """Job params as request-style args, so the routes' argument parsers apply unchanged"""
+    return MultiDict([
+        (key, str(value)) for key, values in params.items()
+        for value in (values if isinstance(values, list) else [values])
+    ])
+
+def validate_export_job(params):
+    fmt, _, _, _ = parse_export_args(job_args(params))
+    exporter.encoder(fmt)
+
+@job_queue.register('export', validate=validate_export_job)
+def export_job(job, username, **params):
+    """Write an export to a result file, reporting progress per batch.
+
+    Batches are read as keyset pages rather than from one open cursor: on
+    SQLite an open cursor blocks the progress updates.
+    """
+    fmt, start, end, categories = parse_export_args(job_args(params))
+    encoder = exporter.encoder(fmt)
+    query = export_query(username, start, end, categories)
+    total = db.session.execute(select(func.count()).select_from(query.order_by(None).subquery())).scalar()
+    rows, last = 0, None
+    path = job.result_path(encoder.extension)
+    with open(path, 'wb') as out:
+        out.write(encoder.begin())
+        while True:
+            page = query if last is None else query.where(tuple_(Expense.week_date, Expense.id) > last)
+            batch = db.session.execute(page.limit(EXPORT_BATCH_SIZE)).all()
+            if not batch:
+                break
+            out.write(encoder.batch(batch))
+            rows += len(batch)
+            last = (batch[-1].week_date, batch[-1].id)
+            job.progress(rows / total, f"{rows} of {total} rows")
+        out.write(encoder.end())
+    return {
+        "rows": rows, "bytes": os.path.getsize(path),
+        "mimetype": encoder.mimetype, "filename": f"expenses-{username}.{encoder.extension}"
+    }
+
+@job_queue.register('analytics', validate=lambda params: parse_analytics_args(job_args(params)))
+def analytics_job(job, username, **params):
+    start, end, window = parse_analytics_args(job_args(params))
+    rows = db.session.execute(analytics_query(username, start, end)).all()
+    return {"username": username, **analytics_report(rows, start, end, window)}
+
+@job_queue.register('rollup_rebuild', internal=True)
+def rollup_rebuild_job(job, username, **params):
+    return {"rows": rebuild_rollup(username)}
+
+def bounded_int(params, name, default, low, high):
+    """params[name] as a whole number between low and high (inclusive); raises ValueError"""
+    value = params.get(name, default)
+    if isinstance(value, str) and value.isdecimal():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f"{name} must be a whole number between {low} and {high}")
+    return value
+
+def validate_forecast_job(params):
+    """(weeks, workers) for a forecast job; workers is capped at the CPU count"""
+    weeks = bounded_int(params, 'weeks', FORECAST_HISTORY_WEEKS, forecasting.MIN_HISTORY + 1, analytics.MAX_WEEKS)
+    # Inline by default: the job already runs off the request path
+    workers = bounded_int(params, 'workers', 0, 0, os.cpu_count() or 1)
+    return weeks, workers
+
+@job_queue.register('forecast', validate=validate_forecast_job, internal=True)
+def forecast_job(job, username, **params):
+    weeks, workers = validate_forecast_job(params)
+    week, series, anomalies = run_forecasts(weeks=weeks, workers=workers)
+    return {"as_of": week.isoformat(), "series": series, "anomalies": anomalies}
+
+def job_payload(job):
+    payload = {
+        key: job[key] for key in ('id', 'kind', 'username', 'status', 'progress', 'message', 'params', 'result')
+    }
+    for key in ('created_at', 'started_at', 'finished_at', 'expires_at'):
+        payload[key] = job[key].isoformat() if job[key] else None
+    if job['cancel_requested'] and job['status'] == jobs.RUNNING:
+        payload['status'] = 'cancelling'
+    payload['result_url'] = f"/api/jobs/{job['id']}/result" if job['result_file'] else None
+    return payload
+
+# --- Internal Endpoints ---
+INTERNAL_API_TOKEN = os.environ.get('INTERNAL_API_TOKEN')
+
+def internal_token_valid(headers):
+    """True when INTERNAL_API_TOKEN is sent as X-Internal-Token or a bearer token; always False while it is unset"""
+    if not INTERNAL_API_TOKEN:
+        return False
+    token = headers.get('X-Internal-Token', '')
+    authorization = headers.get('Authorization', '')
+    if not token and authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return hmac.compare_digest(token, INTERNAL_API_TOKEN)
+
+def internal_only(view):
+    """Require the internal token; without INTERNAL_API_TOKEN configured the route is closed"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not internal_token_valid(request.headers):
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/internal/identity_cache', methods=['GET'])
+@internal_only
+def identity_cache_stats():
+    """Hit/miss counters for the username existence cache"""
+    return jsonify(user_cache.stats()), 200
+
+@app.route('/api/internal/static_assets', methods=['GET'])
+@internal_only
+def static_asset_stats():
+    """Pages held by the static asset cache and the bytes they take"""
+    return jsonify(static_assets.stats()), 200
+
+@app.route('/api/internal/compression', methods=['GET'])
+@internal_only
+def compression_stats():
+    """Responses compressed per encoding, bytes in and out and CPU time spent"""
+    return jsonify(response_compression.stats()), 200
+
+@app.route('/api/internal/replicas', methods=['GET'])
+@internal_only
+def replica_status():
+    """Health of each read replica and how many requests it served"""
+    return jsonify({"read_your_writes_seconds": READ_YOUR_WRITES_SECONDS, **replica_set.status()}), 200
+
+@app.route('/api/internal/pool', methods=['GET'])
+@internal_only
+def pool_stats():
+    """Connection pool occupancy and checkout wait-time histogram, and the same for each replica"""
+    status = pooling.pool_status(db.engine.pool)
+    if replica_set:
+        status["replicas"] = {name: pooling.pool_status(pool) for name, pool in replica_set.pools().items()}
+    return jsonify(status), 200
+
+@app.route('/api/internal/slow_queries', methods=['GET'])
+@internal_only
+def slow_query_entries():
+    """Statements slower than SLOW_QUERY_MS, newest first"""
+    return jsonify({
+        "threshold_ms": slow_query_log.threshold * 1000,
+        "total": slow_query_log.total,
+        "queries": slow_query_log.entries()
+    }), 200
+
+@app.route('/api/internal/slow_queries', methods=['DELETE'])
+@internal_only
+def clear_slow_queries():
+    """Empty the slow-query ring buffer"""
+    slow_query_log.clear()
+    return jsonify({"message": "Slow query log cleared"}), 200
+
+# --- Request Instrumentation ---
+@app.before_request
+def start_request_timer():
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    g.request_stats = instrumentation.begin(request.method, route)
+
+@app.after_request
+def record_request_timing(response):
+    """Record route latency and SQL usage, and report them in Server-Timing"""
+    token = g.pop('request_stats', None)
+    if token is not None:
+        stats = instrumentation.finish(token, response.status_code)
+        response.headers['Server-Timing'] = instrumentation.server_timing(stats)
+    return response
+
+# --- Response Compression ---
+response_compression = compression.ResponseCompression(
+    min_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    flush_size=int(os.environ.get('COMPRESSION_FLUSH_SIZE', 16384)),
+    levels={
+        'gzip': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+        'zstd': int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3)),
+    }
+)
+
+@app.after_request
+def compress_api_response(response):
+    """Compress /api responses with zstd or gzip when the client accepts it"""
+    if (not request.path.startswith('/api/') or response.direct_passthrough
+            or not 200 <= response.status_code < 300 or response.status_code == 204
+            or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers):
+        return response
+    encoding = response_compression.negotiate(request.accept_encodings, response.mimetype)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = response_compression.compress_chunks(encoding, response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response_compression.compress(encoding, response.get_data())
+        if body is None:
+            return response
+        response.set_data(body)
+    response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def metrics_text(pools, replica_health=None):
+    """Request, connection pool, compression, replica and identity cache metrics in Prometheus text format.
+
+    ``pools`` maps the engine label of each pool the app owns to the pool;
+    ``replica_health`` is the ReplicaSet whose health is reported, if any.
+    """
+    cache = user_cache.stats()
+    lines = instrumentation.render() + pooling.render(pools) + response_compression.render()
+    if replica_health:
+        lines += replica_health.render()
+    lines += metrics.render('identity_cache_entries', 'gauge', 'Usernames currently cached.', [({}, cache['size'])])
+    lines += metrics.render('identity_cache_lookups_total', 'counter', 'Identity cache lookups by result.', [
+        ({'result': 'hit'}, cache['hits']),
+        ({'result': 'negative_hit'}, cache['negative_hits']),
+        ({'result': 'miss'}, cache['misses']),
+    ])
+    lines += metrics.render('identity_cache_evictions_total', 'counter', 'Entries evicted to stay under the size limit.',
+                            [({}, cache['evictions'])])
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics', methods=['GET'])
+@internal_only
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    pools = {'primary': db.engine.pool, **replica_set.pools()}
+    return Response(metrics_text(pools, replica_set), mimetype='text/plain; version=0.0.4')
+
 # --- API Routes ---
 
 @app.route('/api/signup', methods=['POST'])
@@ -75,15 +1347,16 @@ def signup():
     if not data or not data.get("username") or not data.get("password"):
         return jsonify({"error": "Username and password are required"}), 400
 
-    if User.query.filter_by(username=data['username']).first():
+    if user_exists(data['username']):
         return jsonify({"error": "Username already exists"}), 409
 
-    hashed_password = generate_password_hash(data["password"])
+    hashed_password = password_hasher.hash(data["password"])
     user = User(username=data["username"], password=hashed_password)
 
     try:
         db.session.add(user)
         db.session.commit()
+        user_cache.set(user.username, True)
         return jsonify({"message": "User created successfully"}), 201
     except Exception as e:
         db.session.rollback()
@@ -96,9 +1369,19 @@ def login():
         return jsonify({"error": "Username and password are required"}), 400
 
     user = User.query.filter_by(username=data['username']).first()
-    if not user or not check_password_hash(user.password, data['password']):
+    user_cache.set(data['username'], user is not None)
+    if not user or not password_hasher.verify(user.password, data['password']):
         return jsonify({"error": "Invalid username or password"}), 401
 
+    if password_hasher.needs_rehash(user.password):
+        # Hashing parameters changed since this password was stored; upgrade it now
+        # that we know the plaintext. A failure here must not fail the login.
+        try:
+            user.password = password_hasher.hash(data['password'])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
     return jsonify({"message": "Login successful", "user": user.to_dict()}), 200
 
 @app.route('/api/add_expense', methods=['POST'])
@@ -108,7 +1391,7 @@ def add_expense():
     if not all(field in data for field in required_fields):
         return jsonify({"error": "Missing required fields"}), 400
 
-    if not User.query.filter_by(username=data['username']).first():
+    if not user_exists(data['username']):
         return jsonify({"error": "User not found"}), 404
 
     try:
@@ -127,59 +1410,207 @@ def add_expense():
         return jsonify({"error": f"Failed to add expense: {str(e)}"}), 500
 
 @app.route('/api/get_expenses/<string:username>', methods=['GET'])
+@read_only
 def get_expenses(username):
-    if not User.query.filter_by(username=username).first():
+    if not user_exists(username):
         return jsonify({"error": "User not found"}), 404
 
-    expenses = Expense.query.filter_by(username=username).order_by(Expense.week_date.desc()).all()
-    return jsonify({
+    try:
+        after = decode_cursor(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    try:
+        limit = parse_page_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stamp = version_stamp(username)
+    if stamp.is_fresh():
+        return stamp.not_modified()
+
+    query = expense_history_query(username, after)
+
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        # Server-side cursor: rows are fetched and written in batches, never held all at once
+        if limit:
+            query = query.limit(limit)
+        rows = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        return stamp.apply(Response(
+            stream_with_context(
+                serialization.dumps_json(dict(zip(EXPENSE_FIELDS, row))) + b"\n" for row in rows
+            ),
+            mimetype='application/x-ndjson'
+        ))
+
+    if limit is None and after is None:
+        expenses = db.session.execute(query).all()
+        return stamp.apply(encoded_response({
+            "username": username,
+            "expenses": expense_rows(expenses),
+            "total_expenses": len(expenses)
+        })), 200
+
+    limit = limit or EXPENSE_PAGE_MAX
+    expenses = db.session.execute(query.limit(limit + 1)).all()
+    has_more = len(expenses) > limit
+    expenses = expenses[:limit]
+    return stamp.apply(encoded_response({
         "username": username,
-        "expenses": [e.to_dict() for e in expenses],
-        "total_expenses": len(expenses)
-    }), 200
+        "expenses": expense_rows(expenses),
+        "total_expenses": len(expenses),
+        "next_cursor": encode_cursor(expenses[-1]) if has_more else None
+    })), 200
 
 @app.route('/api/weekly_summary/<string:username>', methods=['GET'])
+@read_only
 def weekly_summary(username):
-    if not User.query.filter_by(username=username).first():
+    if not user_exists(username):
         return jsonify({"error": "User not found"}), 404
 
-    today = datetime.utcnow().date()
-    start_of_week = today - timedelta(days=today.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-
-    expenses = Expense.query.filter(
-        Expense.username == username,
-        Expense.week_date >= start_of_week,
-        Expense.week_date <= end_of_week
-    ).all()
+    start_of_week, end_of_week = period_bounds('week')
+    summary = aggregate_expenses(username, start_of_week, end_of_week)
 
-    if not expenses:
+    if not summary["expense_count"]:
         return jsonify({
             "username": username,
             "period": f"{start_of_week} to {end_of_week}",
             "message": "No expenses found for the current week."
         }), 200
 
-    summary = {}
-    total = 0
-    for e in expenses:
-        summary[e.category] = summary.get(e.category, 0) + float(e.amount)
-        total += float(e.amount)
+    return jsonify({
+        "username": username,
+        "period": f"{start_of_week} to {end_of_week}",
+        **summary
+    }), 200
+
+@app.route('/api/summary/<string:username>', methods=['GET'])
+@read_only
+def get_summary(username):
+    """Get a category summary for a week, month, quarter, year or custom date range"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    period = request.args.get('period', 'week')
+    try:
+        if 'start' in request.args or 'end' in request.args:
+            period = 'custom'
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+        else:
+            anchor = request.args.get('date')
+            anchor = datetime.strptime(anchor, '%Y-%m-%d').date() if anchor else None
+            start, end = period_bounds(period, anchor)
+    except KeyError:
+        return jsonify({"error": "Both start and end are required for a custom range"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {str(e)}"}), 400
 
-    highest_category = max(summary, key=summary.get) if summary else None
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
 
     return jsonify({
         "username": username,
-        "period": f"{start_of_week} to {end_of_week}",
-        "category_summary": summary,
-        "total_amount": total,
-        "highest_category": {
-            "category": highest_category,
-            "amount": summary.get(highest_category)
-        } if highest_category else None,
-        "expense_count": len(expenses)
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        **aggregate_expenses(username, start, end)
     }), 200
 
+@app.route('/api/analytics/<string:username>', methods=['GET'])
+@read_only
+def get_analytics(username):
+    """Rolling averages, growth, category shares and volatility over a range of weeks"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        start, end, window = parse_analytics_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stamp = version_stamp(username, start, end)
+    if stamp.is_fresh():
+        return stamp.not_modified()
+
+    rows = db.session.execute(analytics_query(username, start, end)).all()
+    try:
+        report = analytics_report(rows, start, end, window)
+    except analytics.AnalyticsUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+    return stamp.apply(encoded_response({"username": username, **report}))
+
+@app.route('/api/forecasts/<string:username>', methods=['GET'])
+@read_only
+def get_forecasts(username):
+    """Latest batch forecasts and anomaly flags; anomalies=1 returns flagged categories only"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    query = select(CategoryForecast).where(CategoryForecast.username == username)
+    if request.args.get('anomalies') in ('1', 'true'):
+        query = query.where(CategoryForecast.anomaly.is_(True))
+    forecasts = db.session.execute(query.order_by(CategoryForecast.category)).scalars().all()
+    return jsonify(forecasts_payload(username, forecasts)), 200
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a background job and return its id straight away"""
+    data = request.get_json(silent=True) or {}
+    kind, username, params = data.get('kind'), data.get('username'), data.get('params') or {}
+    spec = job_queue.specs.get(kind)
+    if spec is None:
+        return jsonify({"error": f"kind must be one of {', '.join(sorted(job_queue.specs))}"}), 400
+    if not isinstance(params, dict):
+        return jsonify({"error": "params must be an object"}), 400
+    if spec.internal and not internal_token_valid(request.headers):
+        return jsonify({"error": "Forbidden"}), 403
+    if not spec.internal and not username:
+        return jsonify({"error": "username is required"}), 400
+    if username and not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    try:
+        job_id = job_queue.submit(kind, params, username)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job_queue.start()
+    response = jsonify({"id": job_id, "status": jobs.QUEUED, "status_url": f"/api/jobs/{job_id}"})
+    response.headers['Location'] = f"/api/jobs/{job_id}"
+    return response, 202
+
+@app.route('/api/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and (once finished) the result of a job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] == jobs.QUEUED:
+        # Queued jobs may predate this process; make sure someone picks them up
+        job_queue.start()
+    return jsonify(job_payload(job)), 200
+
+@app.route('/api/jobs/<string:job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    if status in (jobs.SUCCEEDED, jobs.FAILED):
+        return jsonify({"error": f"Job already {status}", "status": status}), 409
+    return jsonify({"id": job_id, "status": status}), 200
+
+@app.route('/api/jobs/<string:job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Download the file a job produced"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] != jobs.SUCCEEDED:
+        return jsonify({"error": f"Job is {job['status']}", "status": job['status']}), 409
+    path = job_queue.result_file_path(job)
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Job has no result file"}), 404
+    return send_file(path, mimetype=job['result'].get('mimetype'), as_attachment=True,
+                     download_name=job['result'].get('filename') or job['result_file'])
+
 @app.route('/api/expenses/<int:expense_id>', methods=['PUT'])
 def update_expense(expense_id):
     expense = Expense.query.get_or_404(expense_id)
@@ -210,37 +1641,180 @@ def delete_expense(expense_id):
         db.session.rollback()
         return jsonify({"error": f"Failed to delete expense: {str(e)}"}), 500
 
+@app.route('/api/batch', methods=['POST'])
+def batch_expenses():
+    """Apply many expense adds, updates and deletes in one transaction"""
+    operations, error = parse_batch(request.get_json(silent=True))
+    if error:
+        return jsonify(error[0]), error[1]
+    unknown = {op["username"] for op in operations if op["op"] == 'add' and not user_exists(op["username"])}
+    if unknown:
+        return jsonify(unknown_users_error(operations, unknown)), 404
+
+    try:
+        results, ok = apply_expense_batch(db.session, operations)
+        if not ok:
+            db.session.rollback()
+            return jsonify({"error": "Expense not found", "results": results}), 404
+        db.session.commit()
+        return jsonify({"message": f"Applied {len(results)} operations", "results": results}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to apply batch: {str(e)}"}), 500
+
+@app.route('/api/import/<string:username>', methods=['POST'])
+def import_expenses(username):
+    """Import a CSV, Excel or Parquet statement into a user's expenses"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+
+    upload = request.files.get('file')
+    try:
+        fmt = importer.detect_format(upload.filename if upload else None, request.values.get('format'))
+        chunk_rows = bounded_int(request.values, 'chunk_size', importer.CHUNK_ROWS, 1, IMPORT_CHUNK_MAX)
+        parser = importer.RowParser(
+            {field: request.values[field] for field in importer.FIELDS if request.values.get(field)},
+            request.values.get('date_format')
+        )
+    except ValueError as e:
+        # ImportFileError and bounded_int() messages are written for the client
+        return jsonify({"error": str(e)}), 400
+
+    progress = importer.import_chunks(
+        importer.read_chunks(upload.stream if upload else request.stream, fmt, chunk_rows),
+        parser,
+        lambda rows: write_import_chunk(db.session, username, rows)
+    )
+
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        # One progress line per committed chunk, then the summary with the rejects
+        def generate():
+            result = importer.ImportResult()
+            try:
+                for result in progress:
+                    yield json.dumps(result.as_dict()) + "\n"
+            except importer.ImportFileError as e:
+                yield json.dumps({"error": str(e), **result.as_dict()}) + "\n"
+                return
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Import for %s failed", username)
+                yield json.dumps({"error": "Import failed", **result.as_dict()}) + "\n"
+                return
+            yield json.dumps({"done": True, **result.as_dict(), "rejects": result.rejects}) + "\n"
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    result = importer.ImportResult()
+    try:
+        for result in progress:
+            pass
+    except importer.ImportFileError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        app.logger.exception("Import for %s failed", username)
+        return jsonify({"error": "Import failed", **result.as_dict()}), 500
+    return jsonify({"message": "Import finished", **result.as_dict(), "rejects": result.rejects}), 200
+
+@app.route('/api/export/<string:username>', methods=['GET'])
+@read_only
+def export_expenses(username):
+    """Stream a user's expenses as CSV, Arrow IPC or Parquet"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        fmt, start, end, categories = parse_export_args(request.args)
+        encoder = exporter.encoder(fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stamp = version_stamp(username)
+    if stamp.is_fresh():
+        return stamp.not_modified()
+
+    # Server-side cursor: one batch of rows in memory at a time, sent as it is encoded
+    batches = db.session.execute(export_query(username, start, end, categories)).partitions()
+    response = Response(stream_with_context(exporter.stream(encoder, batches)), mimetype=encoder.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="expenses-{username}.{encoder.extension}"'
+    return stamp.apply(response)
+
 @app.route('/api/weekly_expenses/<string:username>/<int:week_number>', methods=['GET'])
+@read_only
 def get_weekly_expenses(username, week_number):
     """Get expenses for a specific week"""
-    if not User.query.filter_by(username=username).first():
+    if not user_exists(username):
         return jsonify({"error": "User not found"}), 404
     
-    # Calculate week date range
-    today = datetime.utcnow().date()
-    start_of_year = today.replace(month=1, day=1)
-    week_start = start_of_year + timedelta(weeks=week_number-1)
-    week_end = week_start + timedelta(days=6)
+    week_start, week_end = week_bounds(week_number)
+    stamp = version_stamp(username, week_start, week_end)
+    if stamp.is_fresh():
+        return stamp.not_modified()
     
-    expenses = Expense.query.filter(
-        Expense.username == username,
-        Expense.week_date >= week_start,
-        Expense.week_date <= week_end
-    ).all()
+    expenses = db.session.execute(week_expenses_query(username, week_start, week_end)).all()
     
-    return jsonify({
+    return stamp.apply(encoded_response({
         "username": username,
         "week_number": week_number,
         "week_start": week_start.isoformat(),
         "week_end": week_end.isoformat(),
-        "expenses": [e.to_dict() for e in expenses],
+        "expenses": expense_rows(expenses),
         "total_expenses": len(expenses)
-    }), 200
+    })), 200
+
+@app.route('/api/weekly_expenses/<string:username>', methods=['GET'])
+@read_only
+def get_weekly_expenses_range(username):
+    """Expenses and per-week summaries for a range of weeks, from one range query"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        weeks = week_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {str(e)}"}), 400
+
+    start, end = weeks[0][1], weeks[-1][2]
+    stamp = version_stamp(username, start, end)
+    if stamp.is_fresh():
+        return stamp.not_modified()
+
+    rows = db.session.execute(
+        week_expenses_query(username, start, end).order_by(Expense.week_date, Expense.id)
+    ).all()
+    return stamp.apply(encoded_response({
+        "username": username,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "weeks": weeks_payload(rows, weeks)
+    })), 200
+
+@app.route('/api/dashboard/<string:username>/<int:week_number>', methods=['GET'])
+@read_only
+def get_dashboard(username, week_number):
+    """Items, category summary and recent trend for a week, from one range query"""
+    if not user_exists(username):
+        return jsonify({"error": "User not found"}), 404
+    try:
+        trend_weeks = int(request.args.get('trend', DASHBOARD_TREND_WEEKS))
+    except ValueError:
+        return jsonify({"error": "trend must be a number of weeks"}), 400
+    if not 0 <= trend_weeks <= DASHBOARD_TREND_MAX:
+        return jsonify({"error": f"trend must be between 0 and {DASHBOARD_TREND_MAX}"}), 400
+
+    weeks = dashboard_weeks(week_number, trend_weeks)
+    start, end = weeks[0][1], weeks[-1][2]
+    stamp = version_stamp(username, start, end)
+    if stamp.is_fresh():
+        return stamp.not_modified()
+
+    rows = db.session.execute(
+        week_expenses_query(username, start, end).order_by(Expense.week_date, Expense.id)
+    ).all()
+    return stamp.apply(encoded_response(dashboard_payload(username, rows, weeks))), 200
 
 @app.route('/api/weekly_expenses/<string:username>', methods=['POST'])
 def save_weekly_expenses(username):
     """Save or update expenses for a specific week"""
-    if not User.query.filter_by(username=username).first():
+    if not user_exists(username):
         return jsonify({"error": "User not found"}), 404
     
     data = request.get_json()
@@ -250,74 +1824,37 @@ def save_weekly_expenses(username):
     if not week_number:
         return jsonify({"error": "Week number is required"}), 400
     
-    # Calculate week date
-    today = datetime.utcnow().date()
-    start_of_year = today.replace(month=1, day=1)
-    week_start = start_of_year + timedelta(weeks=week_number-1)
+    week_start, week_end = week_bounds(week_number)
     
     try:
-        # Delete existing expenses for this week
-        Expense.query.filter(
-            Expense.username == username,
-            Expense.week_date >= week_start,
-            Expense.week_date <= week_start + timedelta(days=6)
-        ).delete()
-        
-        # Add new expenses
-        for expense_data in expenses:
-            expense = Expense(
-                username=username,
-                category=expense_data['category'],
-                amount=expense_data['amount'],
-                week_date=week_start
-            )
-            db.session.add(expense)
-        
+        changes = sync_week_expenses(db.session, username, week_start, week_end, [
+            (expense_data['category'], to_amount(expense_data['amount'])) for expense_data in expenses
+        ])
         db.session.commit()
-        return jsonify({"message": "Weekly expenses saved successfully"}), 200
+        return jsonify({"message": "Weekly expenses saved successfully", "changes": changes}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Failed to save weekly expenses: {str(e)}"}), 500
 
 @app.route('/api/weekly_summary/<string:username>/<int:week_number>', methods=['GET'])
+@read_only
 def get_weekly_summary(username, week_number):
     """Get summary for a specific week"""
-    if not User.query.filter_by(username=username).first():
+    if not user_exists(username):
         return jsonify({"error": "User not found"}), 404
     
-    # Calculate week date range
-    today = datetime.utcnow().date()
-    start_of_year = today.replace(month=1, day=1)
-    week_start = start_of_year + timedelta(weeks=week_number-1)
-    week_end = week_start + timedelta(days=6)
-    
-    expenses = Expense.query.filter(
-        Expense.username == username,
-        Expense.week_date >= week_start,
-        Expense.week_date <= week_end
-    ).all()
+    week_start, week_end = week_bounds(week_number)
+    stamp = version_stamp(username, week_start, week_end)
+    if stamp.is_fresh():
+        return stamp.not_modified()
     
-    summary = {}
-    total = 0
-    for e in expenses:
-        summary[e.category] = summary.get(e.category, 0) + float(e.amount)
-        total += float(e.amount)
-    
-    highest_category = max(summary, key=summary.get) if summary else None
-    
-    return jsonify({
+    return stamp.apply(jsonify({
         "username": username,
         "week_number": week_number,
         "week_start": week_start.isoformat(),
         "week_end": week_end.isoformat(),
-        "category_summary": summary,
-        "total_amount": total,
-        "highest_category": {
-            "category": highest_category,
-            "amount": summary.get(highest_category)
-        } if highest_category else None,
-        "expense_count": len(expenses)
-    }), 200
+        **aggregate_expenses(username, week_start, week_end)
+    })), 200
 
 # --- New endpoints for week_db.html compatibility ---
 @app.route('/api/Expenses/week/<int:week_number>', methods=['POST'])
@@ -330,58 +1867,36 @@ def add_expenses_for_week(week_number):
         # Use default username for now (can be modified later)
         username = "default_user"
         
-        # Calculate week date
-        today = datetime.utcnow().date()
-        start_of_year = today.replace(month=1, day=1)
-        week_start = start_of_year + timedelta(weeks=week_number-1)
-        
-        # Delete existing expenses for this week
-        Expense.query.filter(
-            Expense.username == username,
-            Expense.week_date >= week_start,
-            Expense.week_date <= week_start + timedelta(days=6)
-        ).delete()
-        
-        # Add new expenses
-        for expense_data in expenses_data:
-            expense = Expense(
-                username=username,
-                category=expense_data['label'],
-                amount=expense_data['amount'],
-                week_date=week_start
-            )
-            db.session.add(expense)
+        week_start, week_end = week_bounds(week_number)
         
+        changes = sync_week_expenses(db.session, username, week_start, week_end, [
+            (expense_data['label'], to_amount(expense_data['amount'])) for expense_data in expenses_data
+        ])
         db.session.commit()
         return jsonify({
             "message": f"Expenses for week {week_number} saved successfully",
-            "count": len(expenses_data)
+            "count": len(expenses_data),
+            "changes": changes
         }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Failed to save expenses: {str(e)}"}), 500
 
 @app.route('/api/Expenses/week/<int:week_number>', methods=['GET'])
+@read_only
 def get_expenses_for_week(week_number):
     """Get expenses for a specific week (compatible with week_db.html)"""
     try:
         # Use default username for now
         username = "default_user"
         
-        # Calculate week date range
-        today = datetime.utcnow().date()
-        start_of_year = today.replace(month=1, day=1)
-        week_start = start_of_year + timedelta(weeks=week_number-1)
-        week_end = week_start + timedelta(days=6)
+        week_start, week_end = week_bounds(week_number)
+        stamp = version_stamp(username, week_start, week_end)
+        if stamp.is_fresh():
+            return stamp.not_modified()
         
-        expenses = Expense.query.filter(
-            Expense.username == username,
-            Expense.week_date >= week_start,
-            Expense.week_date <= week_end
-        ).all()
-        
-        expenses_list = [{"label": expense.category, "amount": float(expense.amount)} for expense in expenses]
-        return jsonify({"data": expenses_list}), 200
+        rows = db.session.execute(week_expenses_query(username, week_start, week_end, WEEK_ITEM_COLUMNS))
+        return stamp.apply(encoded_response({"data": expense_rows(rows, WEEK_ITEM_FIELDS)})), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -422,10 +1937,153 @@ def delete_expense_item(week_number, item_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+# --- CLI Commands ---
+migrate_cli = AppGroup('migrate', help='Apply or roll back database schema migrations.')
+
+@migrate_cli.command('upgrade')
+@click.option('--to', 'target', type=int, default=None, help='Stop after this version.')
+def migrate_upgrade(target):
+    """Apply pending migrations"""
+    if not migrations.upgrade(db.engine, target, echo=click.echo):
+        click.echo("Database is up to date.")
+
+@migrate_cli.command('downgrade')
+@click.option('--to', 'target', type=int, required=True, help='Version to roll back to (0 drops everything).')
+def migrate_downgrade(target):
+    """Roll back migrations newer than --to"""
+    if not migrations.downgrade(db.engine, target, echo=click.echo):
+        click.echo("Nothing to roll back.")
+
+@migrate_cli.command('status')
+def migrate_status():
+    """Show the current schema version and pending migrations"""
+    click.echo(f"Current version: {migrations.current_version(db.engine)}")
+    for m in migrations.pending(db.engine):
+        click.echo(f"Pending {m.version:04d}: {m.description}")
+
+app.cli.add_command(migrate_cli)
+
+rollup_cli = AppGroup('rollup', help='Maintain the weekly_category_totals rollup table.')
+
+@rollup_cli.command('rebuild')
+@click.option('--username', default=None, help='Only rebuild this user.')
+def rollup_rebuild(username):
+    """Recompute rollup rows from the expenses table"""
+    click.echo(f"Rebuilt {rebuild_rollup(username)} rollup row(s).")
+
+app.cli.add_command(rollup_cli)
+
+expenses_cli = AppGroup('expenses', help='Bulk expense maintenance.')
+
+@expenses_cli.command('import')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(importer.FORMATS), default=None,
+              help='File format (default: from the file extension).')
+@click.option('--map', 'mappings', multiple=True, metavar='FIELD=COLUMN',
+              help='Source column for category, amount or week_date; repeatable.')
+@click.option('--date-format', default=None, help='strptime format of the date column (default: YYYY-MM-DD).')
+@click.option('--chunk-size', default=importer.CHUNK_ROWS, show_default=True, help='Rows per committed chunk.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False), default=None,
+              help='Write rejected rows and the reason to this CSV file.')
+def expenses_import(username, path, fmt, mappings, date_format, chunk_size, rejects_path):
+    """Import a CSV, Excel or Parquet statement for USERNAME"""
+    if not user_exists(username):
+        raise click.ClickException(f"User {username} not found")
+    try:
+        parser = importer.RowParser(dict(pair.split('=', 1) for pair in mappings), date_format)
+        fmt = importer.detect_format(path, fmt)
+    except ValueError as e:
+        raise click.BadParameter(str(e) if isinstance(e, importer.ImportFileError) else "use --map FIELD=COLUMN")
+
+    rejects_file = open(rejects_path, 'w', newline='') if rejects_path else None
+    try:
+        with open(path, 'rb') as stream:
+            result = importer.ImportResult()
+            for result in importer.import_chunks(
+                importer.read_chunks(stream, fmt, chunk_size),
+                parser,
+                lambda rows: write_import_chunk(db.session, username, rows),
+                rejects=csv.writer(rejects_file) if rejects_file else None
+            ):
+                click.echo(f"\rImported {result.imported} rows, rejected {result.rejected} "
+                           f"({result.imported / max(result.elapsed, 1e-9):.0f} rows/s)", nl=False)
+    except importer.ImportFileError as e:
+        raise click.ClickException(str(e))
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    click.echo(f"\nDone in {result.elapsed:.1f}s.")
+    for reject in result.rejects[:10]:
+        click.echo(f"  line {reject['line']}: {reject['error']}")
+    if result.rejected and rejects_path:
+        click.echo(f"All rejected rows are in {rejects_path}.")
+
+app.cli.add_command(expenses_cli)
+
+forecast_cli = AppGroup('forecast', help='Batch spend forecasts and anomaly flags.')
+
+@forecast_cli.command('run')
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Any day of the week to score (default: last complete week).')
+@click.option('--weeks', default=FORECAST_HISTORY_WEEKS, show_default=True, help='Weeks of history per series.')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU, 0 runs inline).')
+@click.option('--chunk-series', default=FORECAST_CHUNK_SERIES, show_default=True,
+              help='(username, category) series per worker task.')
+@click.option('--every', type=int, default=None, metavar='SECONDS',
+              help='Keep running, starting a new run this many seconds after the last one started.')
+def forecast_run(as_of, weeks, workers, chunk_series, every):
+    """Forecast next week and flag unusual weeks for every user and category"""
+    if weeks < forecasting.MIN_HISTORY + 1:
+        raise click.BadParameter(f"needs at least {forecasting.MIN_HISTORY + 1} weeks", param_hint='--weeks')
+    while True:
+        started = time.perf_counter()
+        try:
+            week, series, anomalies = run_forecasts(as_of.date() if as_of else None, weeks, workers, chunk_series)
+            click.echo(f"Scored {series} series for the week of {week} ({anomalies} anomalies) "
+                       f"in {time.perf_counter() - started:.1f}s.")
+        except analytics.AnalyticsUnavailable as e:
+            raise click.ClickException(str(e))
+        except Exception as e:
+            if every is None:
+                raise
+            # A scheduled run that fails is retried on the next tick
+            click.echo(f"Forecast run failed: {e}", err=True)
+        if every is None:
+            return
+        time.sleep(max(0, every - (time.perf_counter() - started)))
+
+app.cli.add_command(forecast_cli)
+
+jobs_cli = AppGroup('jobs', help='Run and maintain background jobs.')
+
+@jobs_cli.command('worker')
+@click.option('--workers', default=job_queue.workers or 2, show_default=True, help='Jobs run at the same time.')
+def jobs_worker(workers):
+    """Run queued jobs until interrupted"""
+    job_queue.workers = workers
+    job_queue.start()
+    click.echo(f"Running jobs with {workers} worker(s); Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+@jobs_cli.command('sweep')
+def jobs_sweep():
+    """Fail jobs whose worker went away and delete expired jobs and their files"""
+    failed, deleted = job_queue.sweep()
+    click.echo(f"Marked {failed} stale job(s) failed, deleted {deleted} expired job(s).")
+
+app.cli.add_command(jobs_cli)
+
 # --- Main Execution ---
 if __name__ == '__main__':
     with app.app_context():
-        print("Initializing database...")
-        db.create_all()
-        print("Database initialized successfully.")
+        pending = migrations.pending(db.engine)
+        if pending:
+            print(f"Warning: {len(pending)} pending migration(s). Run 'flask --app main migrate upgrade'.")
+    # Pick up edits to the HTML pages without restarting the dev server
+    static_assets.watch()
     app.run(host='0.0.0.0', port=5003, debug=True)
@@ -0,0 +1,88 @@
+"""Thread-safe in-process metric primitives."""
+import bisect
+import threading
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Return {"buckets": [[upper_bound, cumulative_count], ...], "sum": ..., "count": ...}
+
+        The last bucket's bound is the string "+Inf", as Prometheus writes it,
+        so snapshots stay valid JSON.
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            running += count
+            cumulative.append([bound, running])
+        return {"buckets": cumulative, "sum": total, "count": running}
+
+
+class HistogramVec:
+    """One Histogram per combination of label values"""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = Histogram(self.buckets)
+            return child
+
+    def render(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        return render(self.name, 'histogram', self.documentation, [
+            (dict(zip(self.labelnames, values)), child.snapshot()) for values, child in children
+        ])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def render(name, kind, documentation, samples):
+    """Prometheus text exposition lines for one metric family.
+
+    ``samples`` is a list of ``(labels, value)`` pairs; for histograms the
+    value is a Histogram snapshot.
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if kind == 'histogram':
+            for bound, count in value["buckets"]:
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+        else:
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return lines
@@ -0,0 +1,268 @@
+"""Versioned schema migrations for the expense tracker database.
+
+Every migration has an integer version, an upgrade and a downgrade function
+that receive a SQLAlchemy connection. Applied versions are recorded in the
+``schema_migrations`` table and each migration runs in its own transaction.
+
+Table definitions below are frozen copies of the schema at the time the
+migration was written, so later changes to the models in main.py never
+rewrite history. Run migrations with the Flask CLI:
+
+    flask --app main migrate upgrade
+    flask --app main migrate downgrade --to 1
+    flask --app main migrate status
+"""
+from collections import namedtuple
+from datetime import datetime
+
+import sqlalchemy as sa
+
+Migration = namedtuple('Migration', 'version description upgrade downgrade')
+
+version_table = sa.Table(
+    'schema_migrations', sa.MetaData(),
+    sa.Column('version', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('description', sa.String(200), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+
+# --- Frozen table definitions ---
+def _users_table(metadata):
+    return sa.Table(
+        'users', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('username', sa.String(80), unique=True, nullable=False),
+        sa.Column('password', sa.String(256), nullable=False),
+        sa.Column('created_at', sa.DateTime),
+    )
+
+
+def _expenses_table(metadata):
+    return sa.Table(
+        'expenses', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('username', sa.String(80), sa.ForeignKey('users.username'), nullable=False),
+        sa.Column('category', sa.String(100), nullable=False),
+        sa.Column('amount', sa.Numeric(10, 2), nullable=False),
+        sa.Column('week_date', sa.Date, nullable=False),
+        sa.Column('created_at', sa.DateTime),
+    )
+
+
+def _weekly_category_totals_table(metadata):
+    return sa.Table(
+        'weekly_category_totals', metadata,
+        sa.Column('username', sa.String(80), sa.ForeignKey('users.username'), primary_key=True),
+        sa.Column('week_date', sa.Date, primary_key=True),
+        sa.Column('category', sa.String(100), primary_key=True),
+        sa.Column('total', sa.Numeric(14, 2), nullable=False),
+        sa.Column('count', sa.Integer, nullable=False),
+    )
+
+
+def _expense_versions_table(metadata):
+    return sa.Table(
+        'expense_versions', metadata,
+        sa.Column('username', sa.String(80), sa.ForeignKey('users.username'), primary_key=True),
+        sa.Column('week_date', sa.Date, primary_key=True),
+        sa.Column('version', sa.BigInteger, nullable=False),
+        sa.Column('updated_at', sa.DateTime, nullable=False),
+    )
+
+
+def _category_forecasts_table(metadata):
+    return sa.Table(
+        'category_forecasts', metadata,
+        sa.Column('username', sa.String(80), sa.ForeignKey('users.username'), primary_key=True),
+        sa.Column('category', sa.String(100), primary_key=True),
+        sa.Column('as_of', sa.Date, nullable=False),
+        sa.Column('forecast', sa.Numeric(14, 2), nullable=False),
+        sa.Column('actual', sa.Numeric(14, 2), nullable=False),
+        sa.Column('baseline', sa.Numeric(14, 2)),
+        sa.Column('score', sa.Float),
+        sa.Column('anomaly', sa.Boolean, nullable=False),
+        sa.Column('computed_at', sa.DateTime, nullable=False),
+    )
+
+
+def _jobs_table(metadata):
+    return sa.Table(
+        'jobs', metadata,
+        sa.Column('id', sa.String(32), primary_key=True),
+        sa.Column('kind', sa.String(50), nullable=False),
+        sa.Column('username', sa.String(80), sa.ForeignKey('users.username')),
+        sa.Column('params', sa.Text, nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('progress', sa.Float, nullable=False),
+        sa.Column('message', sa.String(200)),
+        sa.Column('result', sa.Text),
+        sa.Column('result_file', sa.String(255)),
+        sa.Column('cancel_requested', sa.Boolean, nullable=False),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Column('started_at', sa.DateTime),
+        sa.Column('finished_at', sa.DateTime),
+        sa.Column('heartbeat_at', sa.DateTime),
+        sa.Column('expires_at', sa.DateTime),
+    )
+
+
+# --- Migrations ---
+def create_base_tables(conn):
+    # Databases created by the old db.create_all() boot step already have
+    # these tables, so adopt them instead of failing.
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _expenses_table(metadata)
+    metadata.create_all(conn, checkfirst=True)
+
+
+def drop_base_tables(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _expenses_table(metadata)
+    metadata.drop_all(conn, checkfirst=True)
+
+
+def add_expense_indexes(conn):
+    expenses = _expenses_table(sa.MetaData())
+    # Every read and weekly save filters on username plus a week_date range.
+    sa.Index('ix_expenses_username_week_date', expenses.c.username, expenses.c.week_date).create(conn, checkfirst=True)
+    # Lets the GROUP BY category summaries run as index-only scans on Postgres.
+    sa.Index(
+        'ix_expenses_username_week_date_category',
+        expenses.c.username, expenses.c.week_date, expenses.c.category,
+        postgresql_include=['amount']
+    ).create(conn, checkfirst=True)
+
+
+def drop_expense_indexes(conn):
+    expenses = _expenses_table(sa.MetaData())
+    sa.Index('ix_expenses_username_week_date_category', expenses.c.username).drop(conn, checkfirst=True)
+    sa.Index('ix_expenses_username_week_date', expenses.c.username).drop(conn, checkfirst=True)
+
+
+def create_weekly_category_totals(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    expenses = _expenses_table(metadata)
+    totals = _weekly_category_totals_table(metadata)
+    totals.create(conn)
+    # Backfill from existing rows so summaries stay correct right after upgrading
+    conn.execute(totals.insert().from_select(
+        ['username', 'week_date', 'category', 'total', 'count'],
+        sa.select(
+            expenses.c.username, expenses.c.week_date, expenses.c.category,
+            sa.func.sum(expenses.c.amount), sa.func.count()
+        ).group_by(expenses.c.username, expenses.c.week_date, expenses.c.category)
+    ))
+
+
+def drop_weekly_category_totals(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _weekly_category_totals_table(metadata).drop(conn, checkfirst=True)
+
+
+def create_expense_versions(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _expense_versions_table(metadata).create(conn)
+
+
+def drop_expense_versions(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _expense_versions_table(metadata).drop(conn, checkfirst=True)
+
+
+def create_category_forecasts(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _category_forecasts_table(metadata).create(conn)
+
+
+def drop_category_forecasts(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _category_forecasts_table(metadata).drop(conn, checkfirst=True)
+
+
+def create_jobs(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    jobs = _jobs_table(metadata)
+    jobs.create(conn)
+    # Workers claim the oldest queued job; the sweep looks up expired and stale ones
+    sa.Index('ix_jobs_status_created_at', jobs.c.status, jobs.c.created_at).create(conn)
+
+
+def drop_jobs(conn):
+    metadata = sa.MetaData()
+    _users_table(metadata)
+    _jobs_table(metadata).drop(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, 'Create users and expenses tables', create_base_tables, drop_base_tables),
+    Migration(2, 'Index expenses by (username, week_date) and cover category aggregation',
+              add_expense_indexes, drop_expense_indexes),
+    Migration(3, 'Add the weekly_category_totals rollup table',
+              create_weekly_category_totals, drop_weekly_category_totals),
+    Migration(4, 'Add the expense_versions table for conditional GETs',
+              create_expense_versions, drop_expense_versions),
+    Migration(5, 'Add the category_forecasts table for the forecast job',
+              create_category_forecasts, drop_category_forecasts),
+    Migration(6, 'Add the jobs table for background jobs', create_jobs, drop_jobs),
+]
+
+
+# --- Runner ---
+def applied_versions(engine):
+    """Return the set of migration versions recorded in the database; reads only, so it is safe on a replica"""
+    with engine.connect() as conn:
+        if not sa.inspect(conn).has_table(version_table.name):
+            return set()
+        return set(conn.execute(sa.select(version_table.c.version)).scalars())
+
+
+def current_version(engine):
+    return max(applied_versions(engine), default=0)
+
+
+def pending(engine):
+    applied = applied_versions(engine)
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m.version) if m.version not in applied]
+
+
+def upgrade(engine, target=None, echo=print):
+    """Apply pending migrations up to and including target (all by default)"""
+    with engine.begin() as conn:
+        version_table.create(conn, checkfirst=True)
+    applied = []
+    for m in pending(engine):
+        if target is not None and m.version > target:
+            break
+        with engine.begin() as conn:
+            m.upgrade(conn)
+            conn.execute(version_table.insert().values(
+                version=m.version, description=m.description, applied_at=datetime.utcnow()
+            ))
+        echo(f"Applied {m.version:04d}: {m.description}")
+        applied.append(m)
+    return applied
+
+
+def downgrade(engine, target, echo=print):
+    """Roll back applied migrations newer than target, newest first"""
+    applied = applied_versions(engine)
+    reverted = []
+    for m in sorted(MIGRATIONS, key=lambda m: m.version, reverse=True):
+        if m.version <= target or m.version not in applied:
+            continue
+        with engine.begin() as conn:
+            m.downgrade(conn)
+            conn.execute(version_table.delete().where(version_table.c.version == m.version))
+        echo(f"Reverted {m.version:04d}: {m.description}")
+        reverted.append(m)
+    return reverted
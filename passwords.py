@@ -0,0 +1,61 @@
+"""Password hashing off the request thread.
+
+Hashing and verifying passwords is deliberately CPU-expensive. Running it
+inline in a Flask worker blocks that worker (and holds the GIL) for tens of
+milliseconds, so a burst of logins starves every other endpoint. The
+PasswordHasher runs werkzeug's hash functions in a bounded process pool
+instead, and reports when a stored hash was made with outdated parameters
+so it can be upgraded on the next successful login.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """Hash and verify passwords in a process pool.
+
+    ``method`` is any werkzeug method string, e.g. ``scrypt``,
+    ``scrypt:16384:8:1`` or ``pbkdf2:sha256:600000``. ``workers=0`` runs
+    everything inline in the calling thread.
+    """
+
+    def __init__(self, method='scrypt', salt_length=16, workers=None):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pool = None
+        self._parameters = None
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool.submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    @property
+    def parameters(self):
+        """The fully expanded method string werkzeug writes in front of new hashes"""
+        if self._parameters is None:
+            self._parameters = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return self._parameters
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.parameters
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
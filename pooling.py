@@ -0,0 +1,116 @@
+"""Connection pool configuration and instrumentation.
+
+Pool sizing is read from the environment so it can be tuned per deployment
+and per worker count without code changes:
+
+    DB_POOL_SIZE          persistent connections per process (default 5)
+    DB_POOL_MAX_OVERFLOW  extra connections allowed under burst (default 10)
+    DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE       reconnect connections older than this, in seconds (default 1800)
+    DB_POOL_PRE_PING      test connections on checkout, 0/1 (default 1)
+
+InstrumentedQueuePool records how long every checkout waited, so pool
+starvation shows up as a shifting histogram before it shows up as latency.
+Each pool keeps its own histogram, so the primary and every read replica
+are reported as separate series, labelled by engine.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+import metrics
+from metrics import Histogram
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times each checkout and counts checkout timeouts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = Histogram(WAIT_BUCKETS)
+        self._timeouts = [0]
+        self._timeouts_lock = threading.Lock()
+
+    @property
+    def timeouts(self):
+        return self._timeouts[0]
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; its counts carry on from this one's
+        pool = super().recreate()
+        pool.checkout_wait, pool._timeouts, pool._timeouts_lock = self.checkout_wait, self._timeouts, self._timeouts_lock
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._timeouts_lock:
+                self._timeouts[0] += 1
+            raise
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - start)
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool for create_async_engine()"""
+
+
+def engine_options(url, environ=os.environ, poolclass=InstrumentedQueuePool):
+    """SQLAlchemy create_engine() pool arguments for url, taken from the environment"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite uses a per-thread singleton pool that takes no sizing
+        return {}
+    options = {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no'),
+    }
+    if poolclass is not None:
+        options['poolclass'] = poolclass
+    return options
+
+
+def pool_status(pool):
+    """Current occupancy of a QueuePool plus, when it is instrumented, its checkout wait histogram"""
+    status = {}
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update({"checkout_wait_seconds": pool.checkout_wait.snapshot(), "timeouts": pool.timeouts})
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+    return status
+
+
+def render(pools):
+    """Prometheus exposition lines for pool_status() of each pool in a {engine name: pool} mapping"""
+    statuses = [({'engine': name}, pool_status(pool)) for name, pool in pools.items()]
+    lines = []
+    for key, name, kind, documentation in (
+        ('checkout_wait_seconds', 'db_pool_checkout_wait_seconds', 'histogram',
+         'Time spent waiting for a pooled connection.'),
+        ('timeouts', 'db_pool_checkout_timeouts_total', 'counter', 'Checkouts that gave up after DB_POOL_TIMEOUT.'),
+        ('size', 'db_pool_size', 'gauge', 'Configured persistent connections.'),
+        ('checked_out', 'db_pool_checked_out', 'gauge', 'Connections currently in use.'),
+        ('idle', 'db_pool_idle', 'gauge', 'Connections idle in the pool.'),
+        ('overflow', 'db_pool_overflow', 'gauge', 'Overflow connections currently open.'),
+    ):
+        samples = [(labels, status[key]) for labels, status in statuses if key in status]
+        if samples:
+            lines += metrics.render(name, kind, documentation, samples)
+    return lines
@@ -0,0 +1,176 @@
+"""Read-replica routing for read-only requests.
+
+With DATABASE_REPLICA_URLS set, routes marked read-only send their SELECTs
+to a replica. Everything else, and every write anywhere, goes to the
+primary:
+
+    ReplicaSet      one engine per replica URL. choose() hands them out
+                    round-robin, skipping any that failed their last
+                    health check (SELECT 1 every ``check_interval``
+                    seconds) or raised a connection error since.
+    RoutingSession  the Flask-SQLAlchemy session class. When a request's
+                    session has a replica in ``info['replica']``, plain
+                    SELECTs run there. Flushes, DML, SELECT ... FOR UPDATE
+                    and textual SQL run on the primary, and after the first
+                    write the rest of the request stays on the primary too.
+
+Replicas lag behind the primary, so a client that has just written could
+read its old data back. Requests that wrote set a cookie that keeps that
+client's reads on the primary for a short window (read your own writes).
+"""
+import itertools
+import logging
+import threading
+import time
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+import metrics
+
+logger = logging.getLogger('replicas')
+
+
+def parse_urls(value):
+    """Split a comma-separated DATABASE_REPLICA_URLS value"""
+    return [url.strip() for url in (value or '').split(',') if url.strip()]
+
+
+class RoutingSession(Session):
+    """Session that runs SELECTs on ``info['replica']`` when one was chosen for the request"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            # Whatever the request reads after a write must include it
+            self.info.pop('replica', None)
+            self.info['wrote'] = True
+        elif bind is None and self.info.get('replica') is not None and getattr(clause, 'is_select', False) \
+                and getattr(clause, '_for_update_arg', None) is None:
+            return self.info['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replica:
+    def __init__(self, url, engine):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = engine
+        self.healthy = True
+        self.last_error = None
+        self.checked_at = None
+        self.reads = 0
+
+
+class ReplicaSet:
+    """Round-robin over healthy replica engines, with a background health check"""
+
+    def __init__(self, urls, engine_options=lambda url: {}, check_interval=10.0):
+        self.replicas = []
+        for url in urls:
+            replica = Replica(url, create_engine(url, **engine_options(url)))
+            event.listen(replica.engine, 'handle_error', self._error_listener(replica))
+            self.replicas.append(replica)
+        self.check_interval = check_interval
+        self.fallbacks = 0
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self):
+        """The next healthy replica's engine, or None when reads must go to the primary"""
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                self.fallbacks += 1
+                return None
+            replica = healthy[next(self._next) % len(healthy)]
+            replica.reads += 1
+            return replica.engine
+
+    def _error_listener(self, replica):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self._mark(replica, False, str(context.original_exception))
+        return handle_error
+
+    def _mark(self, replica, healthy, error=None):
+        if replica.healthy and not healthy:
+            logger.warning("Replica %s is down: %s", replica.name, error)
+        elif healthy and not replica.healthy:
+            logger.info("Replica %s is back", replica.name)
+        replica.healthy = healthy
+        replica.last_error = error
+
+    def check(self):
+        """Probe every replica with SELECT 1; returns how many are healthy"""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+                self._mark(replica, True)
+            except Exception as e:
+                self._mark(replica, False, str(e.orig) if isinstance(e, DBAPIError) else str(e))
+            replica.checked_at = time.time()
+        return sum(replica.healthy for replica in self.replicas)
+
+    def start(self):
+        """Check the replicas and start the health check thread, once"""
+        if not self.replicas or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            # The first requests must not be sent to a replica that was down from the start
+            self.check()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name='replica-health', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Replica health check failed")
+
+    def pools(self):
+        """{'replica<index>': pool} for every replica engine, in DATABASE_REPLICA_URLS order"""
+        return {f'replica{index}': replica.engine.pool for index, replica in enumerate(self.replicas)}
+
+    def status(self):
+        with self._lock:
+            return {
+                "replicas": [
+                    {"url": replica.name, "healthy": replica.healthy, "reads": replica.reads,
+                     "last_error": replica.last_error, "checked_at": replica.checked_at}
+                    for replica in self.replicas
+                ],
+                "fallbacks": self.fallbacks,
+            }
+
+    def render(self):
+        """Prometheus text lines for replica health and read routing"""
+        status = self.status()
+        lines = metrics.render('db_replica_up', 'gauge', 'Whether the replica passed its last health check.', [
+            ({'replica': replica['url']}, int(replica['healthy'])) for replica in status['replicas']
+        ])
+        lines += metrics.render('db_replica_reads_total', 'counter', 'Read-only requests routed to the replica.', [
+            ({'replica': replica['url']}, replica['reads']) for replica in status['replicas']
+        ])
+        lines += metrics.render('db_replica_fallbacks_total', 'counter',
+                                'Read-only requests sent to the primary because no replica was healthy.',
+                                [({}, status['fallbacks'])])
+        return lines
@@ -0,0 +1,60 @@
+"""Response encoding for the expense list endpoints.
+
+Lists are encoded with orjson when it is installed (falling back to the
+standard library), and clients that send ``Accept: application/msgpack``
+get MessagePack instead, which is smaller and cheaper to decode for large
+histories. Dates and datetimes are written as ISO 8601 strings in every
+format, matching Expense.to_dict().
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+# Older clients still ask for the unregistered x- name
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+
+
+def _default(obj):
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def dumps_msgpack(payload):
+    return msgpack.packb(payload, default=_default, use_bin_type=True)
+
+
+def negotiate(accept_mimetypes):
+    """Pick JSON or MessagePack from a werkzeug Accept header; JSON unless msgpack is asked for"""
+    if msgpack is None:
+        return JSON
+    best = accept_mimetypes.best_match((JSON,) + MSGPACK_TYPES, default=JSON)
+    return MSGPACK if best in MSGPACK_TYPES else JSON
+
+
+def encode(payload, accept_mimetypes):
+    """Return (body, mimetype) for payload in the format the client prefers"""
+    mimetype = negotiate(accept_mimetypes)
+    if mimetype == MSGPACK:
+        return dumps_msgpack(payload), mimetype
+    return dumps_json(payload), mimetype
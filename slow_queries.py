@@ -0,0 +1,150 @@
+"""Slow-query log with sampled EXPLAIN capture.
+
+Every statement that takes longer than the threshold is logged with its SQL,
+the route that issued it and its duration, and kept in a bounded ring buffer
+for /api/internal/slow_queries. Bound parameters can hold usernames and
+password hashes, so they are left out unless ``include_parameters`` is set,
+and even then they are redacted for statements on the users table. A sample of the slow
+SELECTs is re-run under EXPLAIN on the same connection so the plan that was
+actually chosen is captured next to the statement:
+
+    PostgreSQL  EXPLAIN (ANALYZE, BUFFERS), inside a savepoint
+    SQLite      EXPLAIN QUERY PLAN
+
+EXPLAIN ANALYZE executes the query a second time, so keep the sample rate
+low on busy servers.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import instrumentation
+
+logger = logging.getLogger('slow_query')
+
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN (ANALYZE, BUFFERS) ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+PARAMETERS_MAX_LENGTH = 1000
+REDACTED = '<redacted>'
+# Statements on these tables never have their parameters recorded
+SENSITIVE_TABLES = re.compile(r'\busers\b', re.IGNORECASE)
+EXECUTEMANY_SAMPLE = 5
+
+
+class SlowQueryLog:
+    """Ring buffer of statements slower than ``threshold_ms``.
+
+    ``threshold_ms=0`` disables the log. ``explain_rate`` is the fraction of
+    slow SELECT statements whose plan is captured. ``include_parameters``
+    records bound parameters next to the statement.
+    """
+
+    def __init__(self, threshold_ms=250.0, size=100, explain_rate=0.0, include_parameters=False,
+                 sample=random.random):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.include_parameters = include_parameters
+        self._sample = sample
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def install(self, target=Engine):
+        """Listen to statement execution on target (every Engine by default)"""
+        if self.threshold <= 0:
+            return
+        event.listen(target, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(target, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(target, 'handle_error', self._handle_error)
+
+    def entries(self):
+        """Logged statements, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _handle_error(self, context):
+        if context.connection is not None:
+            started = context.connection.info.get('slow_query_started')
+            if started:
+                started.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slow_query_started')
+        if not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        if duration < self.threshold:
+            return
+
+        request = instrumentation.current()
+        plan = None
+        if (not executemany and self.explain_rate and statement.lstrip()[:6].upper() == 'SELECT'
+                and self._sample() < self.explain_rate):
+            plan = explain(conn, statement, parameters)
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "statement": statement,
+            "parameters": self._parameters(statement, parameters, executemany),
+            "executemany": executemany,
+            "method": request.method if request else None,
+            "route": request.route if request else None,
+            "plan": plan,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+        logger.warning("%.1f ms %s %s: %s%s", entry["duration_ms"], entry["method"] or '-', entry["route"] or '-',
+                       statement, f" {entry['parameters']}" if entry["parameters"] else '')
+
+    def _parameters(self, statement, parameters, executemany):
+        if not self.include_parameters:
+            return None
+        if SENSITIVE_TABLES.search(statement):
+            return REDACTED
+        # Only the head of an executemany batch, to avoid repr()ing thousands of rows
+        return repr(parameters[:EXECUTEMANY_SAMPLE] if executemany else parameters)[:PARAMETERS_MAX_LENGTH]
+
+
+def explain(conn, statement, parameters):
+    """Run EXPLAIN for statement on conn's DBAPI connection and return the plan text"""
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    # A raw cursor keeps the EXPLAIN out of SQLAlchemy's own events
+    cursor = conn.connection.dbapi_connection.cursor()
+    savepoint = conn.dialect.name == 'postgresql'
+    try:
+        if savepoint:
+            # A failed EXPLAIN must not abort the request's transaction
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        except Exception as e:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return f"EXPLAIN failed: {e}"
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
@@ -0,0 +1,170 @@
+"""In-memory cache of the HTML pages served by the frontend route.
+
+Every page directly in the root directory is read once at startup and kept in
+memory with gzip and, when the brotli package is installed, brotli
+variants, so serving a page costs neither disk I/O nor compression time.
+Each variant has a strong ETag derived from the page's content and its
+encoding, and the variant is picked from the request's Accept-Encoding:
+
+    asset = assets.get('week_db.html')
+    encoding, body, etag = asset.negotiate(request.accept_encodings)
+
+Variants are only kept when they are smaller than the page itself.
+Subdirectories are never read: the root is usually the app directory, next
+to virtualenvs and job result files that must not be served. Pages
+added or edited after startup are not seen unless watch() is running; it
+polls the files' modification times on a background thread and reloads
+what changed, which is meant for development.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from datetime import datetime, timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger('static_assets')
+
+IDENTITY = 'identity'
+# Pages smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def _compressors():
+    """Available (encoding, compress) pairs, most preferred first"""
+    compressors = []
+    if brotli is not None:
+        compressors.append(('br', lambda data: brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)))
+    # mtime=0 keeps the gzip bytes, and so the ETag, the same across restarts
+    compressors.append(('gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+    return compressors
+
+
+class Asset:
+    """One page and its encoded variants"""
+
+    def __init__(self, name, data, modified, compressors=()):
+        self.name = name
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.modified = modified
+        self.size = len(data)
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        self.variants = {IDENTITY: (data, digest)}
+        if len(data) >= MIN_COMPRESS_SIZE:
+            for encoding, compress in compressors:
+                encoded = compress(data)
+                if len(encoded) < len(data):
+                    self.variants[encoding] = (encoded, f"{digest}-{encoding}")
+        # Offered to negotiate() in order of preference, identity last
+        self.encodings = [encoding for encoding in self.variants if encoding != IDENTITY] + [IDENTITY]
+
+    def negotiate(self, accept_encodings):
+        """Return (encoding, body, etag) for a werkzeug Accept-Encoding header.
+
+        The encoding the client rates highest wins, ties going to the
+        smaller variant; identity is used when nothing else is acceptable.
+        """
+        encoding = accept_encodings.best_match(self.encodings, default=IDENTITY)
+        body, etag = self.variants[encoding]
+        return encoding, body, etag
+
+
+class StaticAssets:
+    """Thread-safe map of file name -> Asset for the files directly in root with one of extensions"""
+
+    def __init__(self, root, extensions=('.html',)):
+        self.root = root
+        self.extensions = tuple(extensions)
+        self.compressors = _compressors()
+        self._assets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def get(self, path):
+        """The Asset for a URL path, or None"""
+        return self._assets.get(path)
+
+    def __len__(self):
+        return len(self._assets)
+
+    def _scan(self):
+        """Map file name -> (mtime_ns, size) of every servable file in root"""
+        found = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.extensions) and not entry.name.startswith('.'):
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            found[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                    except FileNotFoundError:
+                        continue
+        return found
+
+    def _load(self, name, mtime_ns):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            data = f.read()
+        modified = datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc).replace(microsecond=0)
+        return Asset(name, data, modified, self.compressors)
+
+    def load(self):
+        """Load new and changed files and drop removed ones; returns the names that changed"""
+        found = self._scan()
+        changed = [name for name, stat in found.items() if self._stats.get(name) != stat]
+        loaded = {}
+        for name in changed:
+            try:
+                loaded[name] = self._load(name, found[name][0])
+            except FileNotFoundError:
+                found.pop(name)
+        removed = [name for name in self._assets if name not in found]
+        with self._lock:
+            # Swap in a new dict so readers never see a half-updated one
+            assets = {name: asset for name, asset in self._assets.items() if name in found}
+            assets.update(loaded)
+            self._assets = assets
+            self._stats = found
+        return sorted(changed + removed)
+
+    def watch(self, interval=1.0):
+        """Reload changed files every interval seconds on a daemon thread, once"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name='static-watcher', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        with self._lock:
+            watcher, self._watcher = self._watcher, None
+        self._stop.set()
+        if watcher is not None:
+            watcher.join()
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                changed = self.load()
+                if changed:
+                    logger.info("Reloaded static assets: %s", ', '.join(changed))
+            except Exception:
+                logger.exception("Reloading static assets failed")
+
+    def stats(self):
+        assets = self._assets
+        return {
+            "files": len(assets),
+            "bytes": sum(asset.size for asset in assets.values()),
+            "cached_bytes": sum(len(body) for asset in assets.values() for body, _ in asset.variants.values()),
+            "encodings": [encoding for encoding, _ in self.compressors],
+            "watching": self._watcher is not None,
+        }